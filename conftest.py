@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_teardown(item):
+    # Фоновые задачи (миниатюры) пишут в MEDIA_ROOT теста: дожидаемся их
+    # до того, как фикстуры удалят временный каталог.
+    from core.tasks import wait_all
+    wait_all()
@@ -0,0 +1,37 @@
+"""SQLite с настройками для одновременной работы нескольких воркеров.
+
+Помимо обычных параметров sqlite3.connect в DATABASES[...]['OPTIONS']
+понимаются:
+
+* pragmas — словарь PRAGMA, выполняемых на каждом новом соединении
+  (journal_mode=WAL позволяет читать во время записи, busy_timeout —
+  ждать освобождения базы вместо ошибки «database is locked»);
+* transaction_mode — как начинать транзакции atomic(): при IMMEDIATE
+  блокировка на запись берётся сразу в BEGIN, и занятая база
+  дожидается через busy_timeout, а не падает с SQLITE_BUSY при попытке
+  повысить блокировку чтения посреди транзакции.
+"""
+from django.db.backends.sqlite3 import base
+
+EXTRA_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _extra_option(self, name, default):
+        return self.settings_dict['OPTIONS'].get(name, default)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for name in EXTRA_OPTIONS:
+            params.pop(name, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self._extra_option('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self._extra_option('transaction_mode', '')
+        self.cursor().execute(f'BEGIN {mode}'.strip())
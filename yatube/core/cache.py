@@ -0,0 +1,169 @@
+"""Двухуровневый кеш: LRU в памяти процесса поверх общего бэкенда.
+
+Общий уровень (файловый кеш, Redis и т.п.) задаётся отдельным алиасом в
+settings.CACHES и виден всем воркерам. Локальный уровень держит
+ограниченное число последних значений не дольше L1_TIMEOUT секунд.
+
+Согласованность между воркерами:
+* ключи с префиксами из BYPASS_PREFIXES (версии лент) всегда читаются
+  из общего уровня, поэтому смена версии видна сразу всем;
+* delete() и clear() записывают в общий уровень новое поколение, и
+  каждый воркер сбрасывает свой локальный уровень, заметив его
+  (проверка не чаще раза в L1_SYNC_INTERVAL секунд).
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+GENERATION_KEY = 'tiered-cache:generation'
+
+_missing = object()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', location)
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._sync_interval = float(options.get('L1_SYNC_INTERVAL', 1))
+        self._bypass = tuple(options.get('BYPASS_PREFIXES', ()))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._synced_at = 0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _cacheable(self, key):
+        return self._l1_max_entries > 0 and not key.startswith(self._bypass)
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self._sync_interval:
+            return
+        generation = self.shared.get(GENERATION_KEY)
+        with self._lock:
+            if generation != self._generation:
+                self._local.clear()
+                self._generation = generation
+            self._synced_at = now
+
+    def _broadcast(self):
+        self.shared.set(GENERATION_KEY, uuid.uuid4().hex, None)
+        self._synced_at = 0
+
+    def _local_get(self, key, version):
+        local_key = self.make_key(key, version)
+        with self._lock:
+            expires, value = self._local.get(local_key, (0, _missing))
+            if expires <= time.monotonic():
+                self._local.pop(local_key, None)
+                return _missing
+            self._local.move_to_end(local_key)
+            return value
+
+    def _local_set(self, key, value, timeout, version):
+        if not self._cacheable(key):
+            return
+        ttl = self._l1_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            ttl = min(ttl, timeout)
+        local_key = self.make_key(key, version)
+        with self._lock:
+            if ttl <= 0:
+                self._local.pop(local_key, None)
+                return
+            self._local[local_key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._l1_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key, version):
+        with self._lock:
+            self._local.pop(self.make_key(key, version), None)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._local_set(key, value, timeout, version)
+        return added
+
+    def get(self, key, default=None, version=None):
+        if self._cacheable(key):
+            self._sync()
+            value = self._local_get(key, version)
+            if value is not _missing:
+                return value
+        value = self.shared.get(key, _missing, version)
+        if value is _missing:
+            return default
+        self._local_set(key, value, DEFAULT_TIMEOUT, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        remote = []
+        for key in keys:
+            value = _missing
+            if self._cacheable(key):
+                value = self._local_get(key, version)
+            if value is _missing:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            fetched = self.shared.get_many(remote, version)
+            for key, value in fetched.items():
+                self._local_set(key, value, DEFAULT_TIMEOUT, version)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._local_set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(key, value, timeout, version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(key, version)
+        return self.shared.incr(key, delta, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version) is not _missing
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(key, version)
+        self.shared.delete_many(keys, version)
+        # Ключей в обход локального уровня нет ни у одного воркера.
+        if any(self._cacheable(key) for key in keys):
+            self._broadcast()
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+        self._broadcast()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,97 @@
+"""Сжатие ответов gzip и, если установлен пакет brotli, Brotli.
+
+CompressionMiddleware сжимает ответы с типами из COMPRESS_CONTENT_TYPES
+длиной от COMPRESS_MIN_SIZE байт, выбирая лучший из кодеков, которые
+принимает клиент. Статику сжимает заранее collectstatic
+(core.storage), а отдаёт готовые файлы core.static.serve.
+
+Страницы с формами содержат CSRF-токен, но Django маскирует его новой
+солью в каждом ответе, поэтому сжатие не открывает его для BREACH.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Расширения заранее сжатых файлов статики.
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    """Кодеки, которыми умеет сжимать процесс, от лучшего к худшему."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def accepted_encodings(request):
+    """Кодеки из Accept-Encoding запроса, кроме запрещённых q=0."""
+    accepted = set()
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name.strip():
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(request, encodings):
+    """Первый из encodings, который принимает клиент, или None."""
+    accepted = accepted_encodings(request)
+    for encoding in encodings:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def is_compressible(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return content_type in settings.COMPRESS_CONTENT_TYPES
+
+
+def compress(data, encoding, static=False):
+    """Сжимает data; для статики — с наибольшей степенью сжатия."""
+    if encoding == 'br':
+        quality = 11 if static else settings.COMPRESS_BROTLI_QUALITY
+        return brotli.compress(data, quality=quality)
+    level = 9 if static else settings.COMPRESS_GZIP_LEVEL
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # Потоковые ответы (файлы статики) сжаты заранее или не сжимаются.
+        if (response.streaming or response.has_header('Content-Encoding')
+                or not is_compressible(response.get('Content-Type'))
+                or len(response.content) < settings.COMPRESS_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request, available_encodings())
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # Сжатое тело не совпадает побайтно с исходным: ETag становится
+        # слабым, как в django.middleware.gzip.GZipMiddleware.
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = 'Загружает все шаблоны и сообщает, сколько времени занял разбор'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--slowest', type=int, default=5,
+            help='Сколько самых медленных шаблонов показать',
+        )
+
+    def handle(self, *args, **options):
+        report = warm_templates()
+        errors = [(name, error) for name, _, error in report if error]
+        total = sum(seconds for _, seconds, _ in report)
+        slowest = sorted(report, key=lambda row: row[1], reverse=True)
+        for name, seconds, _ in slowest[:options['slowest']]:
+            self.stdout.write(f'{seconds * 1000:8.1f} мс  {name}')
+        for name, error in errors:
+            self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'Шаблонов: {len(report)}, разбор: {total * 1000:.1f} мс')
+        if errors:
+            raise CommandError(f'Шаблонов с ошибками: {len(errors)}')
+        self.stdout.write(self.style.SUCCESS('Шаблоны загружены'))
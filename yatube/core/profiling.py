@@ -0,0 +1,166 @@
+"""Профилирование запросов к базе и отрисовки шаблонов.
+
+QueryProfilingMiddleware считает для каждого запроса число SQL-запросов,
+их суммарное время, повторы одинаковых запросов и время отрисовки
+шаблонов. Результат уходит в заголовки X-Query-* / X-Template-Time и в
+лог core.profiling одной JSON-строкой.
+
+Для вьюх из settings.QUERY_BUDGETS проверяется бюджет запросов; при
+QUERY_BUDGET_STRICT превышение бюджета — исключение, что удобно в
+тестах.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Текст запроса без параметров: одинаков для запросов N+1."""
+    return ' '.join(sql.split())
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = Counter()
+        self.statements = Counter()
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        # Глубина вложенных отрисовок: время считается только у внешней.
+        self.render_depth = 0
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторили уже выполненный запрос дословно."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def repeated(self, threshold):
+        return {
+            sql: count for sql, count in self.queries.items()
+            if count >= threshold
+        }
+
+    def record(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            key = fingerprint(sql)
+            self.queries[key] += 1
+            self.statements[(key, repr(params))] += 1
+
+    def __enter__(self):
+        _state.profile = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _state.profile = None
+
+
+def current_profile():
+    return getattr(_state, 'profile', None)
+
+
+class ProfiledTemplate:
+    """Обёртка шаблона, засекающая время его отрисовки."""
+
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        profile = current_profile()
+        if profile is None or profile.render_depth:
+            return self._wrapped.render(context, request)
+        profile.render_depth += 1
+        start = time.perf_counter()
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            profile.render_time += time.perf_counter() - start
+            profile.render_depth -= 1
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, сообщающий время отрисовки профилировщику."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name))
+
+
+class QueryProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_PROFILING:
+            return self.get_response(request)
+        with ExitStack() as stack:
+            profile = stack.enter_context(RequestProfile())
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.record))
+            response = self.get_response(request)
+        match = request.resolver_match
+        view_name = match.view_name if match else ''
+        self.report(request, response, view_name, profile)
+        self.check_budget(view_name, profile)
+        return response
+
+    def report(self, request, response, view_name, profile):
+        response['X-Query-Count'] = str(profile.query_count)
+        response['X-Query-Time'] = f'{profile.sql_time * 1000:.1f}'
+        response['X-Query-Duplicates'] = str(profile.duplicates)
+        response['X-Template-Time'] = f'{profile.render_time * 1000:.1f}'
+        repeated = profile.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        logger.info(json.dumps({
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': profile.query_count,
+            'sql_ms': round(profile.sql_time * 1000, 1),
+            'template_ms': round(profile.render_time * 1000, 1),
+            'duplicates': profile.duplicates,
+            'repeated': repeated,
+        }, ensure_ascii=False))
+        if repeated:
+            logger.warning(
+                'Possible N+1 in %s: %s', view_name or request.path,
+                ', '.join(f'{count}x {sql[:80]}'
+                          for sql, count in repeated.items()),
+            )
+
+    def check_budget(self, view_name, profile):
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is None or profile.query_count <= budget:
+            return
+        message = (
+            f'{view_name} made {profile.query_count} queries, '
+            f'budget is {budget}'
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
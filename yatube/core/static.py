@@ -0,0 +1,76 @@
+"""Отдача собранной статики из STATIC_ROOT, когда перед приложением нет
+отдельного веб-сервера (STATIC_SERVE = True).
+
+Если клиент принимает сжатые ответы, отдаётся заранее сжатая копия
+файла (.br или .gz). Файлы с хешем содержимого в имени кешируются
+клиентами и прокси на STATIC_MAX_AGE, остальные перепроверяются по
+Last-Modified.
+"""
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .compression import SUFFIXES, choose_encoding, is_compressible
+
+
+def is_hashed(name):
+    """Имя файла с хешем содержимого из манифеста collectstatic."""
+    return name in getattr(staticfiles_storage, 'hashed_names', ())
+
+
+def _find_variant(request, path):
+    """Путь к лучшей сжатой копии, которую принимает клиент."""
+    encodings = [
+        encoding for encoding in SUFFIXES
+        if os.path.isfile(path + SUFFIXES[encoding])
+    ]
+    encoding = choose_encoding(request, encodings)
+    if encoding is None:
+        return path, None
+    return path + SUFFIXES[encoding], encoding
+
+
+def serve(request, path):
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    if not os.path.isfile(full_path):
+        raise Http404(path)
+    content_type = (
+        mimetypes.guess_type(full_path)[0] or 'application/octet-stream')
+    compressible = is_compressible(content_type)
+    served_path, encoding = full_path, None
+    if compressible:
+        served_path, encoding = _find_variant(request, full_path)
+    stat = os.stat(served_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(served_path, 'rb'))
+        # FileResponse угадывает тип по имени и для .gz вернул бы
+        # application/gzip.
+        response['Content-Type'] = content_type
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if compressible:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if is_hashed(name):
+        patch_cache_control(
+            response, public=True, max_age=settings.STATIC_MAX_AGE,
+            immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,55 @@
+"""Хранилище статики с хешами в именах и заранее сжатыми копиями.
+
+После того как ManifestStaticFilesStorage раскладывает файлы под
+именами с хешем содержимого, collectstatic сохраняет рядом с каждым
+сжимаемым файлом копии .gz и, если установлен brotli, .br. Сжатие
+с наибольшей степенью делается один раз при выкладке, а не на каждый
+запрос.
+"""
+import mimetypes
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.functional import cached_property
+
+from .compression import (SUFFIXES, available_encodings, compress,
+                          is_compressible)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    @cached_property
+    def hashed_names(self):
+        """Имена с хешем из манифеста для проверок на каждый запрос."""
+        return frozenset(self.hashed_files.values())
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        self.__dict__.pop('hashed_names', None)
+        if dry_run:
+            return
+        # Промежуточные хеши файлов, которые ссылаются друг на друга,
+        # манифест не отдаёт: сжимаются только окончательные имена.
+        for hashed_name in sorted(set(self.hashed_files.values())):
+            for variant in self.compress_file(hashed_name):
+                yield hashed_name, variant, True
+
+    def compress_file(self, name):
+        """Сохраняет сжатые копии файла; возвращает их имена."""
+        if not is_compressible(mimetypes.guess_type(name)[0]):
+            return []
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < settings.COMPRESS_MIN_SIZE:
+            return []
+        variants = []
+        for encoding in available_encodings():
+            compressed = compress(data, encoding, static=True)
+            if len(compressed) >= len(data):
+                continue
+            variant = name + SUFFIXES[encoding]
+            if self.exists(variant):
+                self.delete(variant)
+            self._save(variant, ContentFile(compressed))
+            variants.append(variant)
+        return variants
@@ -0,0 +1,65 @@
+"""Фоновые задачи в пуле потоков текущего процесса.
+
+Пул создаётся при первой задаче. settings.BACKGROUND_WORKERS = 0
+отключает пул: задачи выполняются сразу в вызывающем потоке.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='yatube-background',
+            )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', func.__qualname__)
+    finally:
+        connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    """Ставит функцию в очередь пула потоков."""
+    if not settings.BACKGROUND_WORKERS:
+        return func(*args, **kwargs)
+    future = get_executor().submit(_run, func, args, kwargs)
+    with _lock:
+        _pending.add(future)
+    future.add_done_callback(_forget)
+    return future
+
+
+def _forget(future):
+    with _lock:
+        _pending.discard(future)
+
+
+def wait_all(timeout=None):
+    """Ждёт завершения уже поставленных задач, например перед выходом."""
+    with _lock:
+        futures = list(_pending)
+    wait(futures, timeout)
+
+
+def submit_on_commit(func, *args, **kwargs):
+    """Ставит функцию в очередь после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
@@ -0,0 +1,30 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=None, on_ends=1):
+    """Номера страниц у краёв и вокруг текущей; None — пропуск."""
+    if on_each_side is None:
+        on_each_side = settings.PAGINATOR_WINDOW
+    last = page_obj.paginator.num_pages
+    number = page_obj.number
+    pages = sorted({
+        *range(1, min(on_ends, last) + 1),
+        *range(max(number - on_each_side, 1),
+               min(number + on_each_side, last) + 1),
+        *range(max(last - on_ends + 1, 1), last + 1),
+    })
+    window = []
+    previous = 0
+    for page in pages:
+        # Пропуск в одну страницу короче показать самой страницей.
+        if page - previous == 2:
+            window.append(previous + 1)
+        elif page - previous > 2:
+            window.append(None)
+        window.append(page)
+        previous = page
+    return window
@@ -0,0 +1,17 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from yatube import settings_test
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты manage.py test с кешами из yatube.settings_test."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_caches = override_settings(CACHES=settings_test.CACHES)
+        self._test_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_caches.disable()
+        super().teardown_test_environment(**kwargs)
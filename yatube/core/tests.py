@@ -1,6 +1,30 @@
-from django.test import TestCase
+import gzip
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import Http404
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from .cache import TieredCache
+from .profiling import ProfiledTemplate, QueryBudgetExceeded, RequestProfile
+from .static import serve
+from .tasks import submit, wait_all
+from .warmup import warm_templates
+
 
 class ViewTestClass(TestCase):
     def test_error_page(self):
@@ -12,3 +36,231 @@ class ViewTestClass(TestCase):
         response = self.client.get(reverse('posts:post_edit'))
         self.assertEqual(response.status_code, 403)
         self.assertTemplateUsed(response, 'core/403.html')
+
+
+class TasksTests(TestCase):
+    @override_settings(BACKGROUND_WORKERS=1)
+    def test_wait_all(self):
+        """wait_all дожидается задач, уже поставленных в пул"""
+        release = threading.Event()
+        done = []
+        submit(release.wait)
+        submit(done.append, True)
+        release.set()
+        wait_all()
+        self.assertEqual(done, [True])
+
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-tests',
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class TieredCacheTests(TestCase):
+    def make_worker(self):
+        return TieredCache('shared', {'OPTIONS': {
+            'L1_TIMEOUT': 60,
+            'L1_SYNC_INTERVAL': 0,
+            'BYPASS_PREFIXES': ('version:',),
+        }})
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.first = self.make_worker()
+        self.second = self.make_worker()
+
+    def test_tests_keep_shared_tier_in_memory(self):
+        """Тесты не трогают файловый кеш сервера разработки"""
+        self.assertIsInstance(caches['shared'], LocMemCache)
+
+    def test_values_shared_between_workers(self):
+        """Значение, записанное одним воркером, видно другому"""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get_many(['key', 'nope']),
+                         {'key': 'value'})
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Повторное чтение обслуживается из памяти процесса"""
+        self.first.set('key', 'value')
+        caches['shared'].set('key', 'changed')
+        self.assertEqual(self.first.get('key'), 'value')
+
+    def test_delete_broadcasts_to_other_workers(self):
+        """Удаление ключа сбрасывает локальный уровень других воркеров"""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_bypass_prefixes_read_from_shared(self):
+        """Версии лент всегда читаются из общего уровня"""
+        self.first.set('version:index', 'v1')
+        self.second.set('version:index', 'v2')
+        self.assertEqual(self.first.get('version:index'), 'v2')
+
+
+@override_settings(QUERY_PROFILING=True)
+class QueryProfilingTests(TestCase):
+    def test_profile_headers(self):
+        """Ответ содержит статистику запросов к базе и шаблонов"""
+        response = self.client.get(reverse('posts:index'))
+        for header in ('X-Query-Count', 'X-Query-Time',
+                       'X-Query-Duplicates', 'X-Template-Time'):
+            with self.subTest(header=header):
+                self.assertIn(header, response)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+    def test_nested_render_timed_once(self):
+        """Вложенная отрисовка не добавляет своё время второй раз"""
+        class Template:
+            def __init__(self, inner=None):
+                self.inner = inner
+
+            def render(self, context=None, request=None):
+                return self.inner.render() if self.inner else ''
+
+        page = ProfiledTemplate(Template(ProfiledTemplate(Template())))
+        with mock.patch('core.profiling.time.perf_counter',
+                        side_effect=itertools.count()):
+            with RequestProfile() as profile:
+                page.render()
+        self.assertEqual(profile.render_time, 1)
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:index': 0}, QUERY_BUDGET_STRICT=True)
+    def test_budget_exceeded(self):
+        """Превышение бюджета запросов роняет тест"""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('posts:index'))
+
+
+class SQLiteBackendTests(TransactionTestCase):
+    def test_pragmas(self):
+        """Новое соединение получает PRAGMA из настроек базы"""
+        pragmas = settings.DATABASES['default']['OPTIONS']['pragmas']
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], pragmas['busy_timeout'])
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], pragmas['cache_size'])
+
+    def test_immediate_transactions(self):
+        """atomic() сразу берёт блокировку на запись"""
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                pass
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class WarmTemplatesTests(TestCase):
+    def test_warm_templates(self):
+        """Прогрев загружает шаблоны проекта и приложений без ошибок"""
+        report = {name: error for name, _, error in warm_templates()}
+        self.assertIn('posts/includes/post_card.html', report)
+        self.assertIn('admin/base.html', report)
+        self.assertFalse(any(report.values()))
+        stdout = StringIO()
+        call_command('warm_templates', stdout=stdout)
+        self.assertIn(f'Шаблонов: {len(report)}', stdout.getvalue())
+
+
+class CompressionTests(TestCase):
+    def test_html_compressed(self):
+        """Страница сжимается gzip, если клиент его принимает"""
+        url = reverse('posts:index')
+        plain = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        refused = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(refused.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESS_MIN_SIZE=10 ** 9)
+    def test_small_response_not_compressed(self):
+        """Ответы короче порога отдаются как есть"""
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        self.addCleanup(shutil.rmtree, self.root)
+        os.mkdir(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as css:
+            css.write('body { margin: 0; }\n' * 200)
+        # Ссылка на другой файл даёт промежуточные хеши при пост-обработке.
+        with open(os.path.join(source, 'css', 'main.css'), 'w') as css:
+            css.write('@import url("site.css");\n')
+            css.write('p { color: red; }\n' * 200)
+        settings_override = override_settings(
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=self.root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def get(self, name, **headers):
+        request = RequestFactory().get(f'/static/{name}', **headers)
+        return serve(request, name)
+
+    def test_precompressed_hashed_files(self):
+        """collectstatic сохраняет сжатые копии файлов с хешем в имени"""
+        hashed = staticfiles_storage.stored_name('css/site.css')
+        self.assertNotEqual(hashed, 'css/site.css')
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.root, hashed + '.gz')))
+        response = self.get(hashed, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            b'body { margin: 0; }\n' * 200)
+        response.close()
+
+    def test_only_final_names_compressed(self):
+        """Сжатые копии есть только у имён из манифеста"""
+        compressed = {
+            os.path.relpath(os.path.join(root, name), self.root)[:-3]
+            for root, _, files in os.walk(self.root)
+            for name in files if name.endswith('.gz')
+        }
+        final = set(staticfiles_storage.hashed_files.values())
+        self.assertIn(staticfiles_storage.stored_name('css/main.css'),
+                      compressed)
+        self.assertEqual(compressed - final, set())
+
+    def test_hashed_names_cached(self):
+        """Имена с хешем собираются в множество один раз на хранилище"""
+        names = staticfiles_storage.hashed_names
+        self.assertIsInstance(names, frozenset)
+        self.assertIn(staticfiles_storage.stored_name('css/site.css'), names)
+        self.assertIs(staticfiles_storage.hashed_names, names)
+
+    def test_unhashed_and_missing_files(self):
+        """Файлы без хеша перепроверяются, выход из STATIC_ROOT — 404"""
+        response = self.get('css/site.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        response.close()
+        for name in ('css/missing.css', '../secret.txt'):
+            with self.subTest(name=name):
+                with self.assertRaises(Http404):
+                    self.get(name)
@@ -0,0 +1,58 @@
+"""Прогрев кеша шаблонов при старте воркера.
+
+С кешированным загрузчиком каждый шаблон читается и разбирается один
+раз на процесс, но первый запрос к каждой странице всё равно платит за
+разбор её шаблонов и всех подключаемых через {% include %}.
+warm_templates() заранее загружает все шаблоны из каталогов
+загрузчиков, и первый запрос воркера отрисовывается так же быстро, как
+остальные.
+"""
+import os
+import time
+
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.xml')
+
+
+def _loader_dirs(loader):
+    # Кешированный загрузчик сам шаблоны не ищет, а оборачивает другие.
+    for inner in getattr(loader, 'loaders', ()):
+        yield from _loader_dirs(inner)
+    if hasattr(loader, 'get_dirs'):
+        yield from loader.get_dirs()
+
+
+def template_names(engine):
+    """Имена всех шаблонов, которые может найти движок."""
+    seen = set()
+    for loader in engine.template_loaders:
+        for directory in _loader_dirs(loader):
+            for root, _, files in os.walk(directory):
+                for file_name in sorted(files):
+                    if not file_name.endswith(TEMPLATE_EXTENSIONS):
+                        continue
+                    name = os.path.relpath(
+                        os.path.join(root, file_name), directory)
+                    name = name.replace(os.sep, '/')
+                    if name not in seen:
+                        seen.add(name)
+                        yield name
+
+
+def warm_templates():
+    """Загружает все шаблоны; возвращает [(имя, секунды, ошибка)]."""
+    report = []
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        for name in template_names(engine):
+            start = time.perf_counter()
+            error = None
+            try:
+                engine.get_template(name)
+            except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+                error = exc
+            report.append((name, time.perf_counter() - start, error))
+    return report
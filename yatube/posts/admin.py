@@ -1,16 +1,22 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .search import search_posts
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group', 'image')
-    search_fields = ('text', 'group', 'author')
+    search_fields = ('text',)
     list_filter = ('pub_date',)
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -21,11 +27,11 @@ class GroupAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('created', 'post', 'author', 'text',)
-    search_fields = ('post', 'text', 'author')
+    search_fields = ('text', 'author__username')
     list_filter = ('created',)
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author',)
-    search_fields = ('user', 'author',)
+    search_fields = ('user__username', 'author__username',)
@@ -0,0 +1,157 @@
+"""JSON API лент и постов для мобильных клиентов.
+
+Строки выбираются через values(), без создания моделей, и листаются
+курсором (KeysetPaginator). ETag и Last-Modified берутся из версий
+областей кеша (caching.conditional_response): они меняются при любой
+правке постов ленты, поэтому повторный запрос неизменившейся ленты
+получает 304 без выборки постов из базы.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from .caching import (INDEX_SCOPE, conditional_response, follow_scope,
+                      group_scope, profile_scope)
+from .feeds import get_follow_feed
+from .models import Comment, Group, Post, User
+from .utils import KeysetPaginator
+
+POST_FIELDS = (
+    'pk', 'text', 'pub_date', 'author__username', 'group__slug', 'image',
+    'thumbnail', 'comments_count',
+)
+COMMENT_FIELDS = ('pk', 'text', 'created', 'author__username')
+
+
+def _media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def serialize_post(row):
+    return {
+        'id': row['pk'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': _media_url(row['image']),
+        'thumbnail': _media_url(row['thumbnail']),
+        'comments_count': row['comments_count'],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['pk'],
+        'text': row['text'],
+        'created': row['created'].isoformat(),
+        'author': row['author__username'],
+    }
+
+
+def _limit(request, default):
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        limit = default
+    return min(max(limit, 1), settings.API_PAGE_SIZE_LIMIT)
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def _page(request, rows, ordering, per_page, serialize):
+    paginator = KeysetPaginator(rows, _limit(request, per_page), ordering)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return {
+        'results': [serialize(row) for row in page],
+        'next': _page_url(request, page.next_cursor),
+        'previous': _page_url(request, page.previous_cursor),
+    }
+
+
+def _conditional(request, scopes, build, private=False):
+    def respond():
+        return JsonResponse(
+            build(), json_dumps_params={'ensure_ascii': False})
+    cache_control = {'no_cache': True}
+    if private:
+        cache_control['private'] = True
+    response = conditional_response(
+        request, scopes, respond, **cache_control)
+    if private:
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _feed(request, posts, scopes, private=False):
+    def build():
+        return _page(
+            request, posts.values(*POST_FIELDS), ('-pub_date', '-pk'),
+            settings.SLICE, serialize_post)
+    return _conditional(request, scopes, build, private)
+
+
+@require_safe
+def index(request):
+    return _feed(request, Post.objects.all(), (INDEX_SCOPE,))
+
+
+@require_safe
+def group_posts(request, slug):
+    group_id = get_object_or_404(
+        Group.objects.values_list('pk', flat=True), slug=slug)
+    return _feed(
+        request, Post.objects.filter(group_id=group_id),
+        (group_scope(group_id),))
+
+
+@require_safe
+def profile(request, username):
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username)
+    return _feed(
+        request, Post.objects.filter(author_id=author_id),
+        (profile_scope(author_id),))
+
+
+@require_safe
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Нужно войти в аккаунт'}, status=401,
+            json_dumps_params={'ensure_ascii': False})
+    return _feed(
+        request, get_follow_feed(request.user),
+        (INDEX_SCOPE, follow_scope(request.user.pk)), private=True)
+
+
+@require_safe
+def post_detail(request, post_id):
+    row = get_object_or_404(
+        Post.objects.values(*POST_FIELDS, 'author_id', 'group_id'),
+        pk=post_id)
+    # Правки поста и новые комментарии меняют версию профиля автора,
+    # переименование группы — версию группы.
+    scopes = [profile_scope(row['author_id'])]
+    if row['group_id'] is not None:
+        scopes.append(group_scope(row['group_id']))
+
+    def build():
+        comments = Comment.objects.filter(post_id=post_id).values(
+            *COMMENT_FIELDS)
+        return {
+            'post': serialize_post(row),
+            'comments': _page(
+                request, comments, ('-created', '-pk'),
+                settings.COMMENTS_FIRST_PAGE, serialize_comment),
+        }
+    return _conditional(request, scopes, build)
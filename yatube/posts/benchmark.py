@@ -0,0 +1,370 @@
+"""Синтетические данные и замеры скорости страниц постов.
+
+seed() наполняет базу пользователями, группами, подписками, постами и
+комментариями. Распределения неравномерные, как в живом сервисе:
+популярность авторов подчиняется закону Ципфа, поэтому у немногих
+авторов тысячи подписчиков, а у большинства — единицы.
+
+run_benchmark() прогоняет страницы через тестовый клиент Django в
+текущем процессе и для каждой считает перцентили времени ответа, число
+и время SQL-запросов, время отрисовки шаблонов и пик памяти. Сеть и
+WSGI-сервер в замер не входят, так что цифры сравнимы только между
+прогонами на одной машине — для этого результаты сохраняются как
+базовая линия и сравниваются с ней.
+"""
+import itertools
+import random
+import time
+import tracemalloc
+from array import array
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core.profiling import RequestProfile
+
+from .bulk import explicit_dates, finish_bulk_load
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+VIEWS = ('index', 'group_list', 'profile', 'follow_index', 'post_detail')
+
+WORDS = (
+    'пост', 'лента', 'город', 'утро', 'вечер', 'новости', 'кофе', 'книга',
+    'поезд', 'море', 'горы', 'дождь', 'солнце', 'работа', 'проект',
+    'команда', 'релиз', 'музыка', 'концерт', 'фильм', 'друзья', 'кот',
+    'собака', 'парк', 'велосипед', 'отпуск', 'фото', 'рецепт', 'ужин',
+    'зима', 'лето', 'весна', 'осень', 'код', 'база', 'сервер', 'запрос',
+    'идея', 'встреча', 'история',
+)
+
+POST_TEXT_WORDS = (8, 80)
+COMMENT_TEXT_WORDS = (3, 25)
+IMAGE_SIZE = (1280, 720)
+
+
+def _text(rng, bounds):
+    words = rng.choices(WORDS, k=rng.randint(*bounds))
+    return ' '.join(words).capitalize() + '.'
+
+
+def _zipf_cum_weights(count, skew):
+    return list(itertools.accumulate(
+        1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _make_images(rng, prefix, count):
+    """Сохраняет несколько картинок, которые делят между собой посты."""
+    names = []
+    for number in range(count):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        image = Image.new('RGB', IMAGE_SIZE, color)
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=80)
+        names.append(default_storage.save(
+            f'posts/{prefix}_{number}.jpg', ContentFile(buffer.getvalue())))
+    return names
+
+
+def _seed_users(prefix, count, batch_size):
+    start = User.objects.filter(username__startswith=f'{prefix}_').count()
+    password = make_password(None)
+    rows = (
+        User(username=f'{prefix}_{start + number}', password=password)
+        for number in range(count)
+    )
+    for batch in _batched(rows, batch_size):
+        User.objects.bulk_create(batch)
+    return list(
+        User.objects.filter(username__startswith=f'{prefix}_')
+        .order_by('pk').values_list('pk', flat=True)[start:]
+    )
+
+
+def _seed_groups(rng, prefix, count):
+    start = Group.objects.filter(slug__startswith=f'{prefix}-').count()
+    Group.objects.bulk_create(
+        Group(title=f'{prefix} {start + number}',
+              slug=f'{prefix}-{start + number}',
+              description=_text(rng, POST_TEXT_WORDS))
+        for number in range(count)
+    )
+    return list(
+        Group.objects.filter(slug__startswith=f'{prefix}-')
+        .values_list('pk', flat=True)
+    )
+
+
+def _follow_rows(rng, user_pks, cum_weights, mean):
+    for user_pk in user_pks:
+        count = min(int(rng.expovariate(1 / mean)), len(user_pks) - 1)
+        authors = set(rng.choices(user_pks, cum_weights=cum_weights, k=count))
+        authors.discard(user_pk)
+        for author_pk in authors:
+            yield Follow(user_id=user_pk, author_id=author_pk)
+
+
+def _post_rows(rng, count, writers, cum_weights, group_pks, image_names,
+               image_ratio, now, period):
+    for _ in range(count):
+        yield Post(
+            text=_text(rng, POST_TEXT_WORDS),
+            author_id=rng.choices(writers, cum_weights=cum_weights)[0],
+            group_id=(
+                rng.choice(group_pks)
+                if group_pks and rng.random() < 0.7 else None),
+            image=(
+                rng.choice(image_names)
+                if image_names and rng.random() < image_ratio else ''),
+            pub_date=now - timedelta(seconds=rng.uniform(0, period)),
+        )
+
+
+def _comment_rows(rng, count, post_pks, post_ages, user_pks, now):
+    for _ in range(count):
+        number = rng.randrange(len(post_pks))
+        yield Comment(
+            post_id=post_pks[number],
+            author_id=rng.choice(user_pks),
+            text=_text(rng, COMMENT_TEXT_WORDS),
+            created=now - timedelta(
+                seconds=rng.uniform(0, post_ages[number])),
+        )
+
+
+def seed(users=1000, groups=20, posts=100000, follows=20, comments=50000,
+         image_ratio=0.2, images=10, skew=1.1, days=365, prefix='bench',
+         batch_size=5000, seed_value=None, thumbnails=True, log=None):
+    """Создаёт синтетический набор данных и возвращает число записей."""
+    rng = random.Random(seed_value)
+    log = log or (lambda message: None)
+    now = timezone.now()
+    with transaction.atomic():
+        log(f'Пользователи: {users}')
+        user_pks = _seed_users(prefix, users, batch_size)
+        # Порядок в списке задаёт ранг по Ципфу, перемешиваем его, чтобы
+        # популярность не совпадала с датой регистрации. Плодовитость
+        # авторов ранжируется отдельно: если самые читаемые авторы ещё и
+        # пишут больше всех, ленты подписок раздуваются на порядки.
+        rng.shuffle(user_pks)
+        writers = rng.sample(user_pks, len(user_pks))
+        cum_weights = _zipf_cum_weights(len(user_pks), skew)
+
+        log(f'Группы: {groups}')
+        group_pks = _seed_groups(rng, prefix, groups)
+
+        log(f'Подписки: ~{len(user_pks) * follows}')
+        follows_before = Follow.objects.count()
+        if follows:
+            rows = _follow_rows(rng, user_pks, cum_weights, follows)
+            for batch in _batched(rows, batch_size):
+                Follow.objects.bulk_create(batch, ignore_conflicts=True)
+
+        log(f'Посты: {posts}')
+        image_names = _make_images(rng, prefix, images) if image_ratio else []
+        first_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        # Массивы вместо списка кортежей: на миллионах постов это
+        # десятки мегабайт вместо сотен.
+        post_pks, post_ages = array('q'), array('d')
+        with explicit_dates(Post, 'pub_date'), \
+                explicit_dates(Comment, 'created'):
+            rows = _post_rows(
+                rng, posts if user_pks else 0, writers, cum_weights,
+                group_pks, image_names, image_ratio, now,
+                days * 24 * 60 * 60,
+            )
+            for batch in _batched(rows, batch_size):
+                Post.objects.bulk_create(batch)
+            created_posts = Post.objects.filter(pk__gt=first_post)
+            for pk, pub_date in created_posts.values_list(
+                    'pk', 'pub_date').iterator():
+                post_pks.append(pk)
+                post_ages.append((now - pub_date).total_seconds())
+
+            log(f'Комментарии: {comments}')
+            if post_pks:
+                rows = _comment_rows(
+                    rng, comments, post_pks, post_ages, user_pks, now)
+                for batch in _batched(rows, batch_size):
+                    Comment.objects.bulk_create(batch)
+
+        log('Счётчики, ленты, поисковый индекс и миниатюры')
+        finish_bulk_load(thumbnails=thumbnails)
+    return {
+        'users': len(user_pks),
+        'groups': groups,
+        'follows': Follow.objects.count() - follows_before,
+        'posts': len(post_pks),
+        'comments': comments if post_pks else 0,
+    }
+
+
+def percentile(values, percent):
+    """Перцентиль с линейной интерполяцией между соседними значениями."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (
+        position - lower)
+
+
+def _targets(sample):
+    """Адреса страниц: по несколько разных объектов на каждую вьюху."""
+    groups = list(
+        Group.objects.order_by('?').values_list('slug', flat=True)[:sample])
+    authors = list(
+        AuthorStats.objects.order_by('-followers_count')
+        .values_list('author__username', flat=True)[:sample]
+    )
+    posts = list(
+        Post.objects.order_by('?').values_list('pk', flat=True)[:sample])
+    readers = list(
+        AuthorStats.objects.order_by('-following_count')
+        .values_list('author_id', flat=True)[:sample]
+    )
+    return {
+        'index': [(reverse('posts:index'), None)],
+        'group_list': [
+            (reverse('posts:group_list', args=(slug,)), None)
+            for slug in groups
+        ],
+        'profile': [
+            (reverse('posts:profile', args=(username,)), None)
+            for username in authors
+        ],
+        'follow_index': [
+            (reverse('posts:follow_index'), user_pk) for user_pk in readers
+        ],
+        'post_detail': [
+            (reverse('posts:post_detail', args=(pk,)), None) for pk in posts
+        ],
+    }
+
+
+class _Clients:
+    """Клиенты тестового сервера: анонимный и по одному на читателя."""
+
+    def __init__(self):
+        self.anonymous = Client()
+        self.users = {}
+
+    def get(self, user_pk):
+        if user_pk is None:
+            return self.anonymous
+        if user_pk not in self.users:
+            client = Client()
+            client.force_login(User.objects.get(pk=user_pk))
+            self.users[user_pk] = client
+        return self.users[user_pk]
+
+
+def _request(client, url, cold):
+    if cold:
+        cache.clear()
+    with RequestProfile() as profile, \
+            connection.execute_wrapper(profile.record):
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - start
+    return response.status_code, elapsed, profile
+
+
+def _measure(clients, targets, requests, warmup, memory_samples, cold):
+    cycle = itertools.cycle(targets)
+    for _ in range(warmup):
+        url, user_pk = next(cycle)
+        _request(clients.get(user_pk), url, cold)
+    latencies, queries, sql, render, errors = [], [], [], [], 0
+    for _ in range(requests):
+        url, user_pk = next(cycle)
+        status, elapsed, profile = _request(clients.get(user_pk), url, cold)
+        errors += status >= 400
+        latencies.append(elapsed * 1000)
+        queries.append(profile.query_count)
+        sql.append(profile.sql_time * 1000)
+        render.append(profile.render_time * 1000)
+    peaks = []
+    for _ in range(memory_samples):
+        url, user_pk = next(cycle)
+        client = clients.get(user_pk)
+        tracemalloc.start()
+        try:
+            _request(client, url, cold)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'sql_ms_mean': round(sum(sql) / len(sql), 2),
+        'template_ms_mean': round(sum(render) / len(render), 2),
+        'memory_peak_kb': round(max(peaks), 1) if peaks else None,
+    }
+
+
+def run_benchmark(views=VIEWS, requests=200, warmup=20, sample=20,
+                  memory_samples=3, cold=False):
+    """Замеряет страницы и возвращает словарь {вьюха: метрики}."""
+    if requests < 1:
+        raise ValueError('requests must be positive')
+    targets = _targets(sample)
+    clients = _Clients()
+    results = {}
+    # DEBUG копит все запросы в connection.queries, а профилировщик
+    # запросов считал бы их второй раз, поэтому оба выключены.
+    with override_settings(DEBUG=False, QUERY_PROFILING=False):
+        for view in views:
+            if not targets[view]:
+                continue
+            results[view] = _measure(
+                clients, targets[view], requests, warmup, memory_samples,
+                cold,
+            )
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Сравнивает с базовой линией; возвращает строки и список регрессий."""
+    lines, regressions = [], []
+    for view, metrics in results.items():
+        base = baseline.get(view)
+        if base is None:
+            lines.append(f'{view}: нет в базовой линии')
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_mean'):
+            before, after = base.get(key), metrics[key]
+            if not before:
+                continue
+            change = (after - before) / before
+            lines.append(
+                f'{view} {key}: {before} -> {after} ({change:+.1%})')
+            if change > max_regression:
+                regressions.append(f'{view} {key} {change:+.1%}')
+    return lines, regressions
@@ -0,0 +1,80 @@
+"""Вспомогательные функции для массовой загрузки постов.
+
+bulk_create не вызывает сигналы и save(), поэтому после загрузки ленты,
+счётчики, поисковый индекс, HTML текстов и миниатюры нужно привести в
+порядок одним проходом — это делает finish_bulk_load().
+"""
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from . import counters, feeds, media, search
+from .formatting import FORMATTER_VERSION
+from .models import Comment, Post
+from .thumbnails import build_thumbnail
+
+
+@contextmanager
+def explicit_dates(model, *field_names):
+    """Отключает auto_now_add у полей, чтобы сохранить заданные даты.
+
+    Меняет поле модели на уровне процесса, поэтому годится только для
+    команд управления, а не для кода, работающего рядом с запросами.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+def attach_thumbnails():
+    """Строит по одной миниатюре на картинку и раздаёт её всем постам."""
+    images = (
+        Post.objects.exclude(image='')
+        .order_by().values_list('image', flat=True).distinct()
+    )
+    attached = 0
+    for image in images.iterator():
+        name = build_thumbnail(image)
+        if name is not None:
+            attached += (
+                Post.objects.filter(image=image)
+                .exclude(thumbnail=name).update(thumbnail=name)
+            )
+    return attached
+
+
+def rerender_texts(batch_size=1000):
+    """Отрисовывает HTML текстов, чья версия форматирования устарела."""
+    rendered = 0
+    for model in (Post, Comment):
+        stale = model.objects.exclude(
+            text_format=FORMATTER_VERSION).order_by('pk').only('pk', 'text')
+        last_pk = 0
+        while True:
+            batch = list(stale.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for instance in batch:
+                instance.render_text()
+            model.objects.bulk_update(batch, model.RENDERED_FIELDS)
+            last_pk = batch[-1].pk
+            rendered += len(batch)
+    return rendered
+
+
+def finish_bulk_load(thumbnails=True):
+    """Пересчитывает всё, что при обычном сохранении делают сигналы."""
+    counters.recount()
+    media.recount()
+    rerender_texts()
+    feeds.rebuild_feeds()
+    search.rebuild()
+    if thumbnails:
+        attach_thumbnails()
+    cache.clear()
@@ -0,0 +1,134 @@
+"""Версионные ключи для кеша лент.
+
+Каждая лента зависит от одной или нескольких «областей» (главная,
+группа, профиль, подписки пользователя). У области есть версия в кеше;
+изменение постов меняет версии затронутых областей, и фрагменты со
+старыми ключами больше не читаются, а вытесняются по времени жизни.
+
+Версия начинается с времени её выдачи в миллисекундах, поэтому по
+версиям областей без запросов к базе известно, когда лента менялась
+последний раз. На этом построены условные ответы 304 для API и
+HTML-страниц (conditional_response).
+"""
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+VERSION_KEY = 'feed-version:{}'
+
+INDEX_SCOPE = 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def profile_scope(author_id):
+    return f'profile:{author_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scopes(post, *group_ids):
+    """Области, в которых показывается пост."""
+    scopes = {INDEX_SCOPE, profile_scope(post.author_id)}
+    for group_id in (post.group_id, *group_ids):
+        if group_id is not None:
+            scopes.add(group_scope(group_id))
+    return scopes
+
+
+def follow_scopes(follow):
+    """Лента подписчика и профили обоих пользователей со счётчиками."""
+    return {
+        follow_scope(follow.user_id),
+        profile_scope(follow.user_id),
+        profile_scope(follow.author_id),
+    }
+
+
+def _new_version():
+    return f'{time.time_ns() // 1_000_000:x}.{uuid.uuid4().hex[:6]}'
+
+
+def _changed_at(version):
+    """Время выдачи версии в секундах; для версий без него — сейчас."""
+    stamp, separator, _ = version.partition('.')
+    if separator:
+        try:
+            return int(stamp, 16) / 1000
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _fetch_versions(scopes):
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def get_versions(*scopes):
+    return '-'.join(_fetch_versions(scopes))
+
+
+def get_state(*scopes):
+    """Версия областей и время их последнего изменения (timestamp)."""
+    versions = _fetch_versions(scopes)
+    return '-'.join(versions), max(map(_changed_at, versions))
+
+
+def bump(*scopes):
+    """Инвалидирует все закешированные страницы указанных областей."""
+    cache.set_many(
+        {VERSION_KEY.format(scope): _new_version() for scope in scopes},
+        None,
+    )
+
+
+def page_key(page_obj):
+    if getattr(page_obj, 'is_cursor', False):
+        return f'cursor:{page_obj.cursor}'
+    return f'page:{page_obj.number}'
+
+
+def feed_cache_context(page_obj, *scopes):
+    """Переменные шаблона для тега {% cache %} вокруг ленты."""
+    return {
+        'feed_key': f'{get_versions(*scopes)}:{page_key(page_obj)}',
+        'feed_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def conditional_response(request, scopes, build, **cache_control):
+    """Отвечает 304, если области не менялись, иначе ответом build().
+
+    ETag зависит от версий областей, адреса страницы и
+    PAGE_CACHE_VERSION, Last-Modified — время последнего изменения
+    областей. cache_control передаётся в patch_cache_control.
+    """
+    version, changed_at = get_state(*scopes)
+    etag = quote_etag(hashlib.md5(
+        f'{settings.PAGE_CACHE_VERSION}:{version}:'
+        f'{request.get_full_path()}'.encode()
+    ).hexdigest())
+    last_modified = int(changed_at)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, **cache_control)
+    return response
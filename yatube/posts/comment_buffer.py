@@ -0,0 +1,208 @@
+"""Отложенная запись комментариев пачками.
+
+При COMMENT_BUFFER = True add_comment не пишет комментарий в базу сам,
+а кладёт его в очередь процесса. Очередь сбрасывается одним
+bulk_create раз в COMMENT_BUFFER_INTERVAL секунд или сразу, когда в
+ней набралось COMMENT_BUFFER_BATCH комментариев, — одна транзакция
+вместо сотни при всплеске комментариев к одному посту.
+
+bulk_create не вызывает сигналы, поэтому счётчики комментариев и
+версии кеша flush() меняет сам. Чтобы автор сразу видел свой
+комментарий, до записи он лежит в общем кеше под своим ключом
+(pending_comments()): ключ занимается атомарным cache.add(), так что
+параллельные запросы не затирают комментарии друг друга, а после
+записи в базу flush() его удаляет. Очередь живёт в памяти: при
+аварийном падении процесса теряются комментарии последнего интервала.
+
+Если пачку записать не удалось (например, база занята), она
+возвращается в начало очереди; после COMMENT_BUFFER_RETRIES неудач её
+комментарии сохраняются по одному, чтобы одна плохая запись не
+потянула за собой остальные.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.tasks import submit
+
+from . import caching, counters
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+OVERLAY_KEY = 'comment-overlay:{}:{}:{}'
+
+_queue = []
+_lock = threading.Lock()
+_timer = None
+
+
+def overlay_keys(post_id, user_id):
+    return [
+        OVERLAY_KEY.format(post_id, user_id, slot)
+        for slot in range(settings.COMMENT_OVERLAY_SLOTS)
+    ]
+
+
+def _show_to_author(comment):
+    """Занимает для комментария свободный ключ в общем кеше."""
+    entry = (uuid.uuid4().hex, comment.text, time.time())
+    for key in overlay_keys(comment.post_id, comment.author_id):
+        if cache.add(key, entry, settings.COMMENT_OVERLAY_TIMEOUT):
+            return key, entry[0]
+    # Все ключи заняты: комментарий появится у автора после записи.
+    return None
+
+
+def _forget(batch):
+    """Убирает из общего кеша комментарии, которые больше не ждут."""
+    overlays = dict(
+        comment.overlay for comment in batch
+        if getattr(comment, 'overlay', None))
+    if not overlays:
+        return
+    # Ключ могли занять заново, если запись ждала дольше таймаута.
+    cache.delete_many([
+        key for key, entry in cache.get_many(overlays).items()
+        if entry[0] == overlays[key]
+    ])
+
+
+def enqueue(comment):
+    """Ставит несохранённый комментарий в очередь на запись."""
+    # В очереди держим только идентификаторы, без пользователя запроса.
+    comment = Comment(
+        post_id=comment.post_id, author_id=comment.author_id,
+        text=comment.text)
+    comment.render_text()
+    comment.overlay = _show_to_author(comment)
+    with _lock:
+        _queue.append(comment)
+        full = len(_queue) >= settings.COMMENT_BUFFER_BATCH
+        if not full:
+            _schedule()
+    if full:
+        submit(flush)
+
+
+def _schedule():
+    # Вызывается под _lock.
+    global _timer
+    if _timer is None:
+        _timer = threading.Timer(
+            settings.COMMENT_BUFFER_INTERVAL, submit, (flush,))
+        _timer.daemon = True
+        _timer.start()
+
+
+def _take():
+    global _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        batch = _queue[:]
+        _queue.clear()
+    return batch
+
+
+@transaction.atomic
+def _write(batch):
+    posts = {
+        post.pk: post for post in Post.objects.filter(
+            pk__in={comment.post_id for comment in batch},
+        ).only('author_id', 'group_id')
+    }
+    # Пост могли удалить, пока комментарий ждал в очереди.
+    batch = [comment for comment in batch if comment.post_id in posts]
+    Comment.objects.bulk_create(batch)
+    scopes = set()
+    for post_id, count in Counter(c.post_id for c in batch).items():
+        counters.shift_post(post_id, comments_count=count)
+        scopes |= caching.post_scopes(posts[post_id])
+    caching.bump(*scopes)
+    return len(batch)
+
+
+def _requeue(batch):
+    """Возвращает пачку в очередь; отдаёт комментарии без попыток."""
+    retry, exhausted = [], []
+    for comment in batch:
+        comment.flush_attempts = getattr(comment, 'flush_attempts', 0) + 1
+        if comment.flush_attempts < settings.COMMENT_BUFFER_RETRIES:
+            retry.append(comment)
+        else:
+            exhausted.append(comment)
+    if retry:
+        with _lock:
+            _queue[:0] = retry
+            _schedule()
+    return exhausted
+
+
+def _save_each(batch):
+    """Сохраняет комментарии по одному; возвращает число сохранённых."""
+    saved = 0
+    for comment in batch:
+        try:
+            with transaction.atomic():
+                if Post.objects.filter(pk=comment.post_id).exists():
+                    comment.save()
+                    saved += 1
+        except Exception:
+            logger.exception(
+                'Cannot write buffered comment to post %s', comment.post_id)
+    return saved
+
+
+def flush():
+    """Записывает накопленные комментарии; возвращает их число."""
+    batch = _take()
+    if not batch:
+        return 0
+    try:
+        written = _write(batch)
+    except Exception:
+        logger.exception(
+            'Cannot write %d buffered comments, retrying', len(batch))
+    else:
+        _forget(batch)
+        return written
+    exhausted = _requeue(batch)
+    try:
+        return _save_each(exhausted)
+    finally:
+        _forget(exhausted)
+
+
+def _flush_at_exit():
+    # Повторных попыток после выхода уже не будет.
+    flush()
+    batch = _take()
+    _save_each(batch)
+    _forget(batch)
+
+
+def pending_comments(post_id, user):
+    """Комментарии пользователя к посту, ещё не записанные в базу."""
+    entries = cache.get_many(overlay_keys(post_id, user.pk)).values()
+    return [
+        Comment(
+            post_id=post_id, author=user, text=text,
+            created=datetime.fromtimestamp(stamp, tz=timezone.utc),
+        )
+        for _, text, stamp in sorted(
+            entries, key=lambda entry: entry[2], reverse=True)
+    ]
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,64 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Сигналы меняют счётчики атомарными UPDATE ... SET x = x + 1, без
+чтения текущего значения. Если счётчики разошлись с данными (массовая
+загрузка, ручные правки в базе), их пересчитывает recount().
+"""
+from itertools import islice
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def _shift(queryset, **deltas):
+    queryset.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def shift_author(author_id, **deltas):
+    _shift(AuthorStats.objects.filter(author_id=author_id), **deltas)
+
+
+def shift_post(post_id, **deltas):
+    _shift(Post.objects.filter(pk=post_id), **deltas)
+
+
+def ensure_stats(user):
+    return AuthorStats.objects.get_or_create(author=user)[0]
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def recount(batch_size=1000):
+    """Пересчитывает все счётчики по данным в базе."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True).iterator()
+    # Пачки режем сами: явный batch_size в bulk_create обходит лимит
+    # SQLite на число строк в одном INSERT.
+    while True:
+        batch = [
+            AuthorStats(author_id=pk) for pk in islice(missing, batch_size)]
+        if not batch:
+            break
+        AuthorStats.objects.bulk_create(batch, ignore_conflicts=True)
+    AuthorStats.objects.update(
+        posts_count=_count(Post.objects, 'author'),
+        followers_count=_count(Follow.objects, 'author'),
+        following_count=_count(Follow.objects, 'user'),
+    )
+    Post.objects.update(comments_count=_count(Comment.objects, 'post'))
@@ -0,0 +1,157 @@
+"""Лента подписок с доставкой постов при записи (fan-out-on-write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, поэтому
+чтение ленты — один проход по индексу (user, pub_date) таблицы
+FeedEntry. Для авторов, у которых подписчиков больше
+settings.FEED_FANOUT_LIMIT, раскладка не делается: их посты
+подмешиваются в ленту при чтении. Когда после отписки автор снова
+укладывается в лимит, его последние посты раскладываются по лентам
+оставшихся подписчиков.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import AuthorStats, FeedEntry, Follow, Post
+
+
+def is_popular(author):
+    return AuthorStats.objects.filter(
+        author=author,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def fan_out_post(post):
+    """Доставляет пост в ленты подписчиков автора."""
+    if is_popular(post.author):
+        return
+    followers = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_follow(follow):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    if is_popular(follow.author):
+        return
+    posts = (
+        Post.objects.filter(author_id=follow.author_id)
+        .values_list('pk', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+    )
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=follow.user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_author(author_id):
+    """Раскладывает последние посты автора по лентам всех подписчиков."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            {connection.ops.insert_statement(ignore_conflicts=True)}
+                {FeedEntry._meta.db_table} (user_id, post_id, pub_date)
+            SELECT follow.user_id, post.id, post.pub_date
+            FROM {Follow._meta.db_table} follow
+            JOIN (
+                SELECT id, pub_date FROM {Post._meta.db_table}
+                WHERE author_id = %s
+                ORDER BY pub_date DESC, id DESC
+                LIMIT %s
+            ) post
+            WHERE follow.author_id = %s
+            """,
+            [author_id, settings.FEED_BACKFILL_LIMIT, author_id],
+        )
+
+
+def remove_follow(follow):
+    """Убирает из ленты подписчика посты автора, от которого он отписался.
+
+    Вызывается после уменьшения счётчика подписчиков автора.
+    """
+    FeedEntry.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id,
+    ).delete()
+    # Посты, вышедшие, пока автор был популярным, ни в одну ленту не
+    # попали, а при чтении больше не подмешиваются.
+    if AuthorStats.objects.filter(
+        author_id=follow.author_id,
+        followers_count=settings.FEED_FANOUT_LIMIT,
+    ).exists():
+        backfill_author(follow.author_id)
+
+
+def popular_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются напрямую."""
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values_list('author', flat=True)
+    )
+
+
+def get_follow_feed(user):
+    """Посты авторов, на которых подписан пользователь."""
+    popular = popular_authors(user)
+    if not popular:
+        return (
+            Post.objects.filter(feed_entries__user=user)
+            .order_by('-feed_entries__pub_date', '-pk')
+        )
+    delivered = FeedEntry.objects.filter(user=user).values('post')
+    return Post.objects.filter(Q(pk__in=delivered) | Q(author__in=popular))
+
+
+def rebuild_feeds(users=None):
+    """Пересобирает ленты заново, например после массового импорта.
+
+    Все ленты заполняются одним INSERT ... SELECT: по подпискам на
+    непопулярных авторов берутся их последние FEED_BACKFILL_LIMIT постов,
+    как при backfill_follow(), но без запроса на каждую подписку.
+    """
+    entries = FeedEntry.objects.all()
+    condition, params = '', []
+    if users is not None:
+        entries = entries.filter(user__in=users)
+        user_sql, params = users.values('pk').query.sql_with_params()
+        condition = f'WHERE follow.user_id IN ({user_sql})'
+    entries.delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {FeedEntry._meta.db_table} (user_id, post_id, pub_date)
+            SELECT follow.user_id, post.id, post.pub_date
+            FROM {Follow._meta.db_table} follow
+            LEFT JOIN {AuthorStats._meta.db_table} stats
+                ON stats.author_id = follow.author_id
+            JOIN (
+                SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+                    PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+                ) AS position
+                FROM {Post._meta.db_table}
+            ) post
+                ON post.author_id = follow.author_id AND post.position <= %s
+            {condition}
+            {'AND' if condition else 'WHERE'}
+                COALESCE(stats.followers_count, 0) <= %s
+            """,
+            [settings.FEED_BACKFILL_LIMIT, *params,
+             settings.FEED_FANOUT_LIMIT],
+        )
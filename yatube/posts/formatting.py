@@ -0,0 +1,28 @@
+"""Отрисовка текста постов и комментариев в HTML.
+
+Текст отрисовывается при сохранении и хранится в text_html вместе с
+версией форматирования text_format. Если правила форматирования
+меняются, увеличьте FORMATTER_VERSION: устаревшие записи отрисуются на
+лету при показе, а команда rerender_texts перезапишет их в базе.
+
+Для лент у поста хранится ещё и отрисованное начало текста длиной до
+EXCERPT_LENGTH символов, поэтому его изменение тоже меняет версию.
+"""
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+FORMATTER_VERSION = 2
+
+EXCERPT_LENGTH = 500
+
+
+def render_text(text):
+    """Экранирует текст и разбивает его на абзацы, как фильтр linebreaks."""
+    return linebreaks(text, autoescape=True)
+
+
+def render_excerpt(text):
+    """HTML начала текста и признак того, что текст обрезан."""
+    if len(text) <= EXCERPT_LENGTH:
+        return render_text(text), False
+    return render_text(Truncator(text).chars(EXCERPT_LENGTH)), True
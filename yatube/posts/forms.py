@@ -1,6 +1,9 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
-from .models import Post, Comment
+from . import media
+from .models import Comment, Group, Post
+from .uploads import process_image
 
 
 class PostForm(forms.ModelForm):
@@ -18,6 +21,14 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка'
         }
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        image = process_image(image)
+        media.reserve(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -29,3 +40,33 @@ class CommentForm(forms.ModelForm):
         labels = {
             'text': 'Текст',
         }
+
+
+class SearchForm(forms.Form):
+    ORDER_CHOICES = (
+        ('rank', 'По релевантности'),
+        ('new', 'Сначала новые'),
+    )
+
+    q = forms.CharField(
+        label='Запрос',
+        max_length=200,
+        help_text='Слова, которые должны встретиться в тексте поста',
+    )
+    group = forms.ModelChoiceField(
+        label='Группа',
+        queryset=Group.objects.all(),
+        to_field_name='slug',
+        required=False,
+    )
+    author = forms.CharField(
+        label='Автор',
+        max_length=150,
+        required=False,
+        help_text='Имя пользователя автора',
+    )
+    order = forms.ChoiceField(
+        label='Порядок',
+        choices=ORDER_CHOICES,
+        required=False,
+    )
@@ -0,0 +1,76 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import VIEWS, compare, run_benchmark
+
+COLUMNS = (
+    'p50_ms', 'p95_ms', 'p99_ms', 'queries_mean', 'sql_ms_mean',
+    'template_ms_mean', 'memory_peak_kb', 'errors',
+)
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время ответа, запросы и память страниц постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*',
+            help=f'Какие вьюхи замерять: {", ".join(VIEWS)}; по умолчанию все',
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--sample', type=int, default=20,
+            help='Сколько разных групп, авторов и постов перебирать',
+        )
+        parser.add_argument(
+            '--memory-samples', type=int, default=3,
+            help='Сколько запросов на вьюху замерять под tracemalloc',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--output', help='Сохранить результаты в JSON (базовая линия)',
+        )
+        parser.add_argument(
+            '--baseline', help='Сравнить с сохранённой базовой линией',
+        )
+        parser.add_argument(
+            '--max-regression', type=float, default=0.2,
+            help='Допустимый рост метрик относительно базовой линии',
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['views']) - set(VIEWS)
+        if unknown:
+            raise CommandError(f'Неизвестные вьюхи: {", ".join(unknown)}')
+        results = run_benchmark(
+            views=options['views'] or VIEWS,
+            requests=options['requests'],
+            warmup=options['warmup'],
+            sample=options['sample'],
+            memory_samples=options['memory_samples'],
+            cold=options['cold'],
+        )
+        self.stdout.write(
+            f'{"view":<14}' + ''.join(f'{name:>18}' for name in COLUMNS))
+        for view, metrics in results.items():
+            self.stdout.write(f'{view:<14}' + ''.join(
+                f'{str(metrics[name]):>18}' for name in COLUMNS))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2, ensure_ascii=False)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline:
+                lines, regressions = compare(
+                    results, json.load(baseline), options['max_regression'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError(
+                    'Регрессия относительно базовой линии: '
+                    + ', '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Замеры завершены'))
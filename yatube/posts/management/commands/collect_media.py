@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from posts.media import collect, collect_orphans, recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые не ссылается ни один пост, '
+        'и файлы картинок и миниатюр, неизвестные базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены',
+        )
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Сначала пересчитать ссылки на файлы по постам',
+        )
+        parser.add_argument(
+            '--skip-orphans', action='store_true',
+            help='Не обходить каталоги в поисках файлов без записей в базе',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько файлов сверять с базой одним запросом',
+        )
+
+    def progress(self, field, scanned, orphans):
+        # При --dry-run файлы без ссылок из MediaBlob ещё лежат на диске.
+        orphans = [name for name in orphans if name not in self.collected]
+        self.total += len(orphans)
+        if self.verbosity > 1:
+            for name in orphans:
+                self.stdout.write(name)
+        self.stdout.write(f'{field}: проверено файлов {scanned}')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        dry_run = options['dry_run']
+        if options['recount']:
+            recount()
+        self.collected = set(collect(dry_run=dry_run))
+        if self.verbosity > 1:
+            for name in sorted(self.collected):
+                self.stdout.write(name)
+        self.total = len(self.collected)
+        if not options['skip_orphans']:
+            collect_orphans(dry_run, options['batch_size'], self.progress)
+        verb = 'К удалению' if dry_run else 'Удалено'
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} файлов: {self.total}'))
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.transfer import FORMATS, export_posts, guess_format
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки; «-» — стандартный вывод')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла; по умолчанию по расширению',
+        )
+        parser.add_argument('--author', help='Только посты этого автора')
+        parser.add_argument('--group', help='Только посты группы с этим slug')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        posts = Post.objects.all()
+        if options['author']:
+            posts = posts.filter(author__username=options['author'])
+        if options['group']:
+            posts = posts.filter(group__slug=options['group'])
+        if path == '-':
+            export_posts(sys.stdout, fmt, posts, options['chunk_size'])
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            exported = export_posts(
+                stream, fmt, posts, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Выгружено постов: {exported}'))
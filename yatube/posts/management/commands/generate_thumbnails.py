@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnail, thumbnail_name
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие миниатюры картинок постов'
+
+    def handle(self, *args, **options):
+        posts = (
+            Post.objects.exclude(image='')
+            .values_list('pk', 'image', 'thumbnail')
+        )
+        built = 0
+        for pk, image, thumbnail in posts.iterator():
+            if thumbnail == thumbnail_name(image):
+                continue
+            if generate_thumbnail(pk, image):
+                built += 1
+        self.stdout.write(self.style.SUCCESS(f'Построено миниатюр: {built}'))
@@ -0,0 +1,74 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bulk import finish_bulk_load
+from posts.transfer import FORMATS, PostImporter, guess_format, read_records
+
+
+class Command(BaseCommand):
+    help = 'Загружает посты из JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с постами; «-» — стандартный ввод')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла; по умолчанию по расширению',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько постов сохранять в одной транзакции',
+        )
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать недостающих авторов',
+        )
+        parser.add_argument(
+            '--create-groups', action='store_true',
+            help='Создавать недостающие группы',
+        )
+        parser.add_argument(
+            '--images-from',
+            help='Каталог, из которого копировать картинки постов',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Потоков для копирования картинок',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не пересобирать ленты, счётчики и поисковый индекс',
+        )
+        parser.add_argument(
+            '--skip-thumbnails', action='store_true',
+            help='Не строить миниатюры картинок',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        importer = PostImporter(
+            batch_size=options['batch_size'],
+            create_authors=options['create_authors'],
+            create_groups=options['create_groups'],
+            images_from=options['images_from'],
+            workers=options['workers'],
+            log=self.stdout.write,
+        )
+        if path == '-':
+            importer.run(read_records(sys.stdin, fmt))
+        else:
+            with open(path, encoding='utf-8', newline='') as stream:
+                importer.run(read_records(stream, fmt))
+        for line_number, error in importer.errors:
+            self.stderr.write(f'Строка {line_number}: {error}')
+        if not options['skip_rebuild']:
+            self.stdout.write('Пересборка лент, счётчиков и индекса')
+            finish_bulk_load(thumbnails=not options['skip_thumbnails'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {importer.imported}, '
+            f'пропущено: {len(importer.errors)}'
+        ))
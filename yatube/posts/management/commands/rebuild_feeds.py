@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import rebuild_feeds
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пересобрать ленты только этих пользователей',
+        )
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        rebuild_feeds(users)
+        self.stdout.write(self.style.SUCCESS('Ленты пересобраны'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки при создании недостающих счётчиков',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
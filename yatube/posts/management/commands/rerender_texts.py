@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.bulk import rerender_texts
+
+
+class Command(BaseCommand):
+    help = (
+        'Перерисовывает HTML постов и комментариев '
+        'после смены форматирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей обновлять одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        rendered = rerender_texts(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Перерисовано текстов: {rendered}'))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+
+from posts.benchmark import seed
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу синтетическими данными для замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок у пользователя',
+        )
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.2,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument(
+            '--images', type=int, default=10,
+            help='Сколько разных картинок делят между собой посты',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности авторов',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней разбросаны даты постов',
+        )
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён пользователей и слагов групп',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Зерно генератора для воспроизводимых данных',
+        )
+        parser.add_argument(
+            '--skip-thumbnails', action='store_true',
+            help='Не строить миниатюры картинок',
+        )
+
+    def handle(self, *args, **options):
+        created = seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            follows=options['follows'],
+            comments=options['comments'],
+            image_ratio=options['image_ratio'],
+            images=options['images'],
+            skew=options['skew'],
+            days=options['days'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            seed_value=options['seed'],
+            thumbnails=not options['skip_thumbnails'],
+            log=self.stdout.write,
+        )
+        summary = ', '.join(
+            f'{key}: {value}' for key, value in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Создано — {summary}'))
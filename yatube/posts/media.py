@@ -0,0 +1,221 @@
+"""Учёт ссылок на картинки постов и сборка мусора.
+
+Картинки лежат в ContentAddressedStorage, и один файл может быть у
+многих постов. Число постов, ссылающихся на файл, хранится в MediaBlob
+и меняется сигналами при создании, правке и удалении поста. Файлы, на
+которые больше никто не ссылается, удаляет collect() с миниатюрами.
+
+collect_orphans() находит файлы, о которых база не знает вовсе:
+картинки и миниатюры, оставшиеся от старых версий кода, прерванных
+загрузок или прежних размеров миниатюр. Каталоги обходятся потоком и
+сверяются с базой пачками, так что память не растёт с числом файлов.
+Миниатюры sorl-thumbnail (каталог THUMBNAIL_PREFIX и записи о них в
+kvstore) код больше не создаёт, поэтому они удаляются все.
+"""
+import os
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import (Count, F, IntegerField, OuterRef, Q,
+                              Subquery)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from sorl.thumbnail import default as sorl_default
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from .models import MediaBlob, Post
+from .thumbnails import thumbnail_name
+
+
+def acquire(name):
+    """Учитывает ещё одну ссылку на файл."""
+    blob, created = MediaBlob.objects.get_or_create(
+        name=name, defaults={'references': 1})
+    if not created:
+        MediaBlob.objects.filter(pk=blob.pk).update(
+            references=F('references') + 1, updated=timezone.now())
+
+
+def touch(name):
+    """Откладывает удаление файла, который снова понадобился."""
+    blob, created = MediaBlob.objects.get_or_create(name=name)
+    if not created:
+        MediaBlob.objects.filter(pk=blob.pk).update(updated=timezone.now())
+
+
+def reserve(content):
+    """Откладывает удаление файла, под которым будет сохранена загрузка.
+
+    Хранилище не пишет уже лежащий файл заново, поэтому форма вызывает
+    reserve() до сохранения поста: иначе collect() мог бы удалить файл
+    между проверкой в хранилище и появлением ссылки из поста.
+    """
+    field = Post._meta.get_field('image')
+    touch(field.storage.content_name(
+        field.generate_filename(None, content.name), content))
+
+
+def release(name):
+    """Снимает ссылку; файл без ссылок потом удалит collect()."""
+    MediaBlob.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1, updated=timezone.now())
+
+
+def replace(old_name, new_name):
+    """Переносит ссылку поста со старой картинки на новую."""
+    if old_name == new_name:
+        return
+    if new_name:
+        acquire(new_name)
+    if old_name:
+        release(old_name)
+
+
+def recount(batch_size=1000):
+    """Пересчитывает ссылки на файлы по постам."""
+    names = (
+        Post.objects.exclude(image='').order_by()
+        .values_list('image', flat=True).distinct().iterator()
+    )
+    while True:
+        batch = [MediaBlob(name=name) for name in islice(names, batch_size)]
+        if not batch:
+            break
+        MediaBlob.objects.bulk_create(batch, ignore_conflicts=True)
+    MediaBlob.objects.update(references=Coalesce(
+        Subquery(
+            Post.objects.filter(image=OuterRef('name'))
+            .order_by()
+            .values('image')
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    ))
+
+
+def collect(dry_run=False):
+    """Удаляет файлы без ссылок и их миниатюры; возвращает их имена.
+
+    Файл удаляется, только если ссылки на него пропали раньше, чем
+    MEDIA_GC_GRACE секунд назад: так не пострадает пост, который как раз
+    сохраняется с этой картинкой.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.MEDIA_GC_GRACE)
+    storage = Post._meta.get_field('image').storage
+    candidates = list(MediaBlob.objects.filter(
+        references=0, updated__lt=cutoff).values_list('name', flat=True))
+    collected = []
+    for name in candidates:
+        if Post.objects.filter(image=name).exists():
+            continue
+        collected.append(name)
+        if dry_run:
+            continue
+        deleted, _ = MediaBlob.objects.filter(
+            name=name, references=0, updated__lt=cutoff).delete()
+        # Файл мог понадобиться новому посту (reserve()) уже после
+        # выборки кандидатов.
+        if deleted and not MediaBlob.objects.filter(name=name).exists():
+            storage.delete(name)
+            default_storage.delete(thumbnail_name(name))
+    return collected
+
+
+# Поля постов, чьи каталоги проверяет collect_orphans().
+ORPHAN_FIELDS = ('image', 'thumbnail')
+
+
+def _walk(storage, directory):
+    """Отдаёт (имя, mtime) файлов каталога хранилища по одному."""
+    root = storage.path(directory)
+    if not os.path.isdir(root):
+        return
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, storage.location)
+                    yield (name.replace(os.sep, '/'),
+                           entry.stat(follow_symlinks=False).st_mtime)
+
+
+def find_orphans(field, batch_size=500):
+    """Отдаёт пачками (проверено файлов, файлы без постов) для поля."""
+    model_field = Post._meta.get_field(field)
+    cutoff = time.time() - settings.MEDIA_GC_GRACE
+    touched_after = timezone.now() - timedelta(
+        seconds=settings.MEDIA_GC_GRACE)
+    # Свежие файлы могут принадлежать посту, который ещё сохраняется.
+    files = (
+        name for name, mtime in _walk(
+            model_field.storage, model_field.upload_to.rstrip('/'))
+        if mtime < cutoff
+    )
+    while True:
+        batch = list(islice(files, batch_size))
+        if not batch:
+            return
+        referenced = set(
+            Post.objects.filter(**{f'{field}__in': batch})
+            .values_list(field, flat=True))
+        # Старый файл, снова отданный хранилищем новой загрузке, mtime не
+        # меняет: его защищает запись MediaBlob (reserve(), acquire()).
+        referenced.update(
+            MediaBlob.objects.filter(name__in=batch)
+            .filter(Q(references__gt=0) | Q(updated__gte=touched_after))
+            .values_list('name', flat=True))
+        yield len(batch), [name for name in batch if name not in referenced]
+
+
+def find_sorl_thumbnails(batch_size=500):
+    """Отдаёт пачками (проверено файлов, файлы) миниатюры sorl-thumbnail."""
+    files = (
+        name for name, _ in _walk(
+            default_storage, sorl_settings.THUMBNAIL_PREFIX.rstrip('/'))
+    )
+    while True:
+        batch = list(islice(files, batch_size))
+        if not batch:
+            return
+        yield len(batch), batch
+
+
+def _collect_batches(label, batches, storage, dry_run, progress):
+    total = scanned = 0
+    for checked, orphans in batches:
+        scanned += checked
+        total += len(orphans)
+        if not dry_run:
+            for name in orphans:
+                storage.delete(name)
+            MediaBlob.objects.filter(name__in=orphans).delete()
+        if progress:
+            progress(label, scanned, orphans)
+    return total
+
+
+def collect_orphans(dry_run=False, batch_size=500, progress=None):
+    """Удаляет файлы картинок и миниатюр, на которые нет ссылок в базе.
+
+    После каждой пачки вызывает progress(поле, проверено, файлы пачки без
+    ссылок); возвращает общее число таких файлов.
+    """
+    total = 0
+    for field in ORPHAN_FIELDS:
+        total += _collect_batches(
+            field, find_orphans(field, batch_size),
+            Post._meta.get_field(field).storage, dry_run, progress)
+    total += _collect_batches(
+        'sorl-thumbnail', find_sorl_thumbnails(batch_size),
+        default_storage, dry_run, progress)
+    if not dry_run:
+        sorl_default.kvstore.clear()
+    return total
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    def count(model, field):
+        return Coalesce(Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ), 0)
+
+    AuthorStats.objects.bulk_create(
+        AuthorStats(author_id=pk)
+        for pk in User.objects.values_list('pk', flat=True).iterator()
+    )
+    AuthorStats.objects.update(
+        posts_count=count(Post, 'author'),
+        followers_count=count(Follow, 'author'),
+        following_count=count(Follow, 'user'),
+    )
+    Post.objects.update(comments_count=count(Comment, 'post'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0011_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
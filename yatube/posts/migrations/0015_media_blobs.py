@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:15
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_media_blobs(apps, schema_editor):
+    MediaBlob = apps.get_model('posts', 'MediaBlob')
+    Post = apps.get_model('posts', 'Post')
+    MediaBlob.objects.bulk_create(
+        MediaBlob(name=row['image'], references=row['total'])
+        for row in Post.objects.exclude(image='').order_by()
+        .values('image').annotate(total=Count('pk')).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['image'], name='post_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediablob',
+            index=models.Index(fields=['references', 'updated'], name='media_blob_unreferenced_idx'),
+        ),
+        migrations.RunPython(fill_media_blobs, migrations.RunPython.noop),
+    ]
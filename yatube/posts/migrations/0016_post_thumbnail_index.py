@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_media_blobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['thumbnail'], name='post_thumbnail_idx'),
+        ),
+    ]
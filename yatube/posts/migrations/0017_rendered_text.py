@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_thumbnail_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='text_format',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Версия форматирования'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст в HTML'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_format',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Версия форматирования'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст в HTML'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_rendered_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Начало текста в HTML'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_truncated',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Текст обрезан в лентах'),
+        ),
+    ]
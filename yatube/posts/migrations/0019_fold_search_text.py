@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def refill_fts_table(apps, schema_editor):
+    # До этой миграции FTS5 хранил текст с ё, а запросы приходят с е.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type = 'table' AND name = 'posts_post_fts'"
+        )
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('DELETE FROM posts_post_fts')
+    schema_editor.execute(
+        'INSERT INTO posts_post_fts (rowid, text) '
+        "SELECT id, REPLACE(REPLACE(text, 'ё', 'е'), 'Ё', 'Е') "
+        'FROM posts_post'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.RunPython(refill_fts_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+# Копия posts.formatting на момент миграции: будущие правки
+# форматирования не должны менять то, что она записывает.
+FORMATTER_VERSION = 2
+
+EXCERPT_LENGTH = 500
+
+BATCH_SIZE = 1000
+
+
+def render_text(text):
+    return linebreaks(text, autoescape=True)
+
+
+def _render_post(text):
+    html = render_text(text)
+    if len(text) <= EXCERPT_LENGTH:
+        return html, html, False
+    return html, render_text(Truncator(text).chars(EXCERPT_LENGTH)), True
+
+
+def _render_comment(text):
+    return (render_text(text),)
+
+
+def render_texts(apps, schema_editor):
+    # Без этого старые записи отрисовывались бы на каждом показе, а в
+    # лентах ещё и догружали text отдельным запросом.
+    connection = schema_editor.connection
+    for model_name, render, fields in (
+        ('Post', _render_post,
+         ('text_html', 'excerpt_html', 'text_truncated')),
+        ('Comment', _render_comment, ('text_html',)),
+    ):
+        model = apps.get_model('posts', model_name)
+        stale = model.objects.exclude(
+            text_format=FORMATTER_VERSION).order_by('pk')
+        quote = connection.ops.quote_name
+        # bulk_update строит CASE на каждую строку и здесь в разы
+        # медленнее простого UPDATE через executemany.
+        sql = 'UPDATE {} SET {}, {} = %s WHERE {} = %s'.format(
+            quote(model._meta.db_table),
+            ', '.join(f'{quote(field)} = %s' for field in fields),
+            quote('text_format'),
+            quote(model._meta.pk.column),
+        )
+        last_pk = 0
+        while True:
+            batch = list(
+                stale.filter(pk__gt=last_pk)
+                .values_list('pk', 'text')[:BATCH_SIZE])
+            if not batch:
+                break
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, [
+                    (*render(text), FORMATTER_VERSION, pk)
+                    for pk, text in batch
+                ])
+            last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_fold_search_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(render_texts, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from .formatting import FORMATTER_VERSION, render_excerpt, render_text
+from .storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -26,7 +30,50 @@ class Group(models.Model):
         return self.title[:self._meta.get_field('title').max_length]
 
 
-class Post(models.Model):
+class RenderedText(models.Model):
+    """Текст с заранее отрисованным HTML."""
+    text_html = models.TextField(
+        'Текст в HTML',
+        blank=True,
+        editable=False,
+    )
+    text_format = models.PositiveSmallIntegerField(
+        'Версия форматирования',
+        default=0,
+        editable=False,
+    )
+
+    # Поля, которые заполняет render_text().
+    RENDERED_FIELDS = ('text_html', 'text_format')
+
+    class Meta:
+        abstract = True
+
+    def render_text(self):
+        self.text_html = render_text(self.text)
+        self.text_format = FORMATTER_VERSION
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            # Отложенный текст не загружался, значит, и не менялся.
+            if 'text' not in self.get_deferred_fields():
+                self.render_text()
+        elif 'text' in update_fields:
+            self.render_text()
+            kwargs['update_fields'] = {
+                *update_fields, *self.RENDERED_FIELDS}
+        super().save(*args, **kwargs)
+
+    @property
+    def rendered_text(self):
+        """HTML текста; устаревшая версия отрисовывается заново."""
+        if self.text_format != FORMATTER_VERSION:
+            self.render_text()
+        return mark_safe(self.text_html)
+
+
+class Post(RenderedText):
     text = models.TextField(
         'Текст поста',
         default='--None--',
@@ -46,17 +93,69 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
     )
+    thumbnail = models.ImageField(
+        'Миниатюра',
+        upload_to='thumbs/',
+        blank=True,
+        editable=False,
+    )
     pub_date = models.DateTimeField(
         'Дата создания',
         auto_now_add=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+
+    excerpt_html = models.TextField(
+        'Начало текста в HTML',
+        blank=True,
+        editable=False,
+    )
+    text_truncated = models.BooleanField(
+        'Текст обрезан в лентах',
+        default=False,
+        editable=False,
+    )
+
+    RENDERED_FIELDS = (
+        *RenderedText.RENDERED_FIELDS, 'excerpt_html', 'text_truncated')
+
+    # Счётчики меняются только атомарными UPDATE из сигналов и не должны
+    # перезаписываться устаревшим значением при редактировании поста.
+    COUNTER_FIELDS = ('comments_count',)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date'),
+                name='post_group_pub_date_idx',
+            ),
+            models.Index(
+                fields=('image',),
+                name='post_image_idx',
+            ),
+            models.Index(
+                fields=('thumbnail',),
+                name='post_thumbnail_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         LIMIT = 30
@@ -65,8 +164,91 @@ class Post(models.Model):
     def get_absolute_url(self):
         return reverse('posts:post_detail', args=(self.pk,))
 
+    def render_text(self):
+        super().render_text()
+        self.excerpt_html, self.text_truncated = render_excerpt(self.text)
+
+    @property
+    def rendered_excerpt(self):
+        """HTML начала текста для лент."""
+        if self.text_format != FORMATTER_VERSION:
+            self.render_text()
+        return mark_safe(self.excerpt_html)
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            # Отложенные поля не загружаются ради того, чтобы записать
+            # их обратно.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class MediaBlob(models.Model):
+    """Файл в хранилище картинок и число постов, которые на него ссылаются."""
+    name = models.CharField(
+        'Файл',
+        max_length=100,
+        unique=True,
+    )
+    references = models.PositiveIntegerField(
+        'Количество ссылок',
+        default=0,
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = "Файл картинки"
+        verbose_name_plural = "Файлы картинок"
+        indexes = (
+            models.Index(
+                fields=('references', 'updated'),
+                name='media_blob_unreferenced_idx',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class SearchTerm(models.Model):
+    """Запись инвертированного индекса: слово и пост, где оно встречается."""
+    term = models.CharField(
+        'Слово',
+        max_length=64,
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост',
+    )
+    weight = models.PositiveIntegerField(
+        'Число вхождений',
+        default=1,
+    )
+
+    class Meta:
+        verbose_name = "Слово поискового индекса"
+        verbose_name_plural = "Поисковый индекс"
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'post'),
+                name='unique_search_term',
+            ),
+        )
+
 
-class Comment(models.Model):
+class Comment(RenderedText):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -91,6 +273,42 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = "Коммент"
         verbose_name_plural = "Комменты"
+        indexes = (
+            models.Index(
+                fields=('post', '-created'),
+                name='comment_post_created_idx',
+            ),
+        )
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        'Количество подписок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Счётчики автора"
+        verbose_name_plural = "Счётчики авторов"
+
+    def __str__(self) -> str:
+        return str(self.author)
 
 
 class Follow(models.Model):
@@ -110,3 +328,45 @@ class Follow(models.Model):
     class Meta:
         verbose_name = "Подписки"
         verbose_name_plural = "Подписки"
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+        )
+
+
+class FeedEntry(models.Model):
+    """Материализованная лента подписок: пост, доставленный подписчику."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(
+        'Дата создания поста',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date'),
+                name='feed_user_pub_date_idx',
+            ),
+        )
@@ -0,0 +1,161 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite используется виртуальная таблица FTS5 (создаётся миграцией),
+на остальных базах — собственный инвертированный индекс SearchTerm.
+Оба индекса обновляются сигналами при сохранении и удалении постов, а
+после массовых изменений пересобираются командой rebuild_search_index.
+
+Результат поиска — queryset постов с аннотацией rank: чем меньше, тем
+релевантнее. Его можно фильтровать и листать курсором по (rank, -pk).
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.expressions import RawSQL
+
+from .models import Post, SearchTerm
+
+FTS_TABLE = 'posts_post_fts'
+TERM_MAX_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+WORD_RE = re.compile(r'\w+')
+
+# fold() на SQL для пересборки индекса одним запросом.
+FOLD_SQL = "REPLACE(REPLACE(text, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fold(text):
+    """Заменяет ё на е: FTS5 (unicode61) сам их не приравнивает."""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def tokenize(text):
+    return [
+        word[:TERM_MAX_LENGTH]
+        for word in WORD_RE.findall(fold(text.lower()))
+    ]
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    if not hasattr(connection, 'posts_fts_available'):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = %s",
+                (FTS_TABLE,),
+            )
+            connection.posts_fts_available = cursor.fetchone() is not None
+    return connection.posts_fts_available
+
+
+class Fts5Index:
+    """Индекс во встроенной в SQLite таблице FTS5."""
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (post.pk,))
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                (post.pk, fold(post.text)),
+            )
+
+    def remove(self, post_pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (post_pk,))
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                f'SELECT id, {FOLD_SQL} FROM {Post._meta.db_table}'
+            )
+
+    def search(self, queryset, terms):
+        match = ' '.join(f'"{term}"' for term in terms)
+        table = Post._meta.db_table
+        # RawSQL справа от __in оборачивается в лишние скобки, и SQLite
+        # читает такой подзапрос как скалярный, поэтому условие в extra.
+        return queryset.extra(
+            where=[
+                f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s)'
+            ],
+            params=[match],
+        ).annotate(rank=RawSQL(
+            f'SELECT rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,),
+        ))
+
+
+class TermIndex:
+    """Инвертированный индекс на обычной таблице SearchTerm."""
+
+    def index(self, post):
+        self.remove(post.pk)
+        SearchTerm.objects.bulk_create(
+            SearchTerm(post_id=post.pk, term=term, weight=weight)
+            for term, weight in Counter(tokenize(post.text)).items()
+        )
+
+    def remove(self, post_pk):
+        SearchTerm.objects.filter(post_id=post_pk).delete()
+
+    def rebuild(self, batch_size=500):
+        SearchTerm.objects.all().delete()
+        entries = []
+        for pk, text in Post.objects.values_list('pk', 'text').iterator():
+            entries.extend(
+                SearchTerm(post_id=pk, term=term, weight=weight)
+                for term, weight in Counter(tokenize(text)).items()
+            )
+            if len(entries) >= batch_size:
+                SearchTerm.objects.bulk_create(entries)
+                entries = []
+        SearchTerm.objects.bulk_create(entries)
+
+    def search(self, queryset, terms):
+        terms = set(terms)
+        return (
+            queryset.filter(search_terms__term__in=terms)
+            .annotate(
+                matched=Count('search_terms'),
+                rank=-Sum(F('search_terms__weight')),
+            )
+            .filter(matched=len(terms))
+        )
+
+
+def get_index():
+    if settings.SEARCH_BACKEND == 'fts5' or (
+            settings.SEARCH_BACKEND == 'auto' and fts_available()):
+        return Fts5Index()
+    return TermIndex()
+
+
+def index_post(post):
+    get_index().index(post)
+
+
+def remove_post(post_pk):
+    get_index().remove(post_pk)
+
+
+def rebuild():
+    get_index().rebuild()
+
+
+def search_posts(queryset, query):
+    """Посты из queryset, содержащие все слова запроса."""
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    return get_index().search(queryset, terms)
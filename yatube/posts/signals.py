@@ -0,0 +1,88 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, feeds, media, search, thumbnails
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.ensure_stats(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    if instance.pk and not raw:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, '')
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_author(instance.author_id, posts_count=1)
+        feeds.fan_out_post(instance)
+    media.replace(
+        getattr(instance, '_previous_image', ''), instance.image.name or '')
+    thumbnails.schedule_thumbnail(instance)
+    search.index_post(instance)
+    previous = getattr(instance, '_previous_group_id', None)
+    caching.bump(*caching.post_scopes(instance, previous))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.shift_author(instance.author_id, posts_count=-1)
+    search.remove_post(instance.pk)
+    if instance.image:
+        media.release(instance.image.name)
+    caching.bump(*caching.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_post(instance.post_id, comments_count=1)
+        caching.bump(*caching.post_scopes(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.shift_post(instance.post_id, comments_count=-1)
+    # Пост с текстом не загружается: при каскадном удалении поста это был
+    # бы лишний запрос на каждый комментарий.
+    post = (
+        Post.objects.filter(pk=instance.post_id)
+        .only('author_id', 'group_id').first()
+    )
+    if post is not None:
+        caching.bump(*caching.post_scopes(post))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    caching.bump(caching.INDEX_SCOPE, caching.group_scope(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_author(instance.author_id, followers_count=1)
+        counters.shift_author(instance.user_id, following_count=1)
+        feeds.backfill_follow(instance)
+        caching.bump(*caching.follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.shift_author(instance.author_id, followers_count=-1)
+    counters.shift_author(instance.user_id, following_count=-1)
+    feeds.remove_follow(instance)
+    caching.bump(*caching.follow_scopes(instance))
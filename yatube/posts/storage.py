@@ -0,0 +1,37 @@
+"""Хранилище, адресующее файлы по содержимому.
+
+Файл сохраняется под именем из sha256 его содержимого, поэтому одна и
+та же картинка, загруженная разными пользователями, лежит на диске
+один раз и получает одну миниатюру.
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, называющее файлы по хешу содержимого."""
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        # Файл с тем же именем — тот же файл: второй раз его не пишем.
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
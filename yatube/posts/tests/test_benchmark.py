@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from posts.benchmark import percentile
+
+from .. import models
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_WORKERS=0)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed_posts', users=30, groups=3, posts=200, follows=5,
+            comments=100, image_ratio=0.5, images=2, seed=1,
+            stdout=StringIO(),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_posts(self):
+        """seed_posts создаёт данные и приводит в порядок счётчики и ленты"""
+        posts = models.Post.objects.filter(
+            author__username__startswith='bench_')
+        self.assertEqual(posts.count(), 200)
+        self.assertEqual(models.Group.objects.count(), 3)
+        self.assertEqual(
+            models.Comment.objects.filter(post__in=posts).count(), 100)
+        self.assertTrue(models.FeedEntry.objects.exists())
+        stats = models.AuthorStats.objects.get(
+            author=posts.first().author)
+        self.assertEqual(
+            stats.posts_count, stats.author.posts.count())
+        with_image = posts.exclude(image='')
+        self.assertTrue(with_image.exists())
+        self.assertFalse(with_image.filter(thumbnail='').exists())
+        dates = set(posts.values_list('pub_date', flat=True)[:10])
+        self.assertGreater(len(dates), 1)
+
+    def test_benchmark_views(self):
+        """benchmark_views сохраняет метрики и сверяет их с базовой линией"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'baseline.json')
+        call_command(
+            'benchmark_views', 'index', 'post_detail', requests=3, warmup=1,
+            memory_samples=1, output=output, stdout=StringIO(),
+        )
+        with open(output) as file:
+            results = json.load(file)
+        self.assertEqual(set(results), {'index', 'post_detail'})
+        self.assertEqual(results['index']['errors'], 0)
+        self.assertGreater(results['post_detail']['queries_mean'], 0)
+        self.assertIsNotNone(results['index']['memory_peak_kb'])
+
+        for metrics in results.values():
+            metrics['p50_ms'] = metrics['p95_ms'] = 0.001
+        with open(output, 'w') as file:
+            json.dump(results, file)
+        with self.assertRaises(CommandError):
+            call_command(
+                'benchmark_views', 'index', requests=3, warmup=0,
+                memory_samples=0, baseline=output, stdout=StringIO(),
+            )
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([5], 99), 5)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile(range(1, 101), 95), 95.05)
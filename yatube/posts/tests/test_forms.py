@@ -1,4 +1,5 @@
 from http import HTTPStatus
+from io import BytesIO
 import shutil
 import tempfile
 
@@ -7,6 +8,8 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
+from PIL import Image
+
 from posts.forms import PostForm
 
 from .. import models
@@ -15,6 +18,8 @@ from .. import models
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(
     dir=settings.BASE_DIR)
 
+IMAGE_NAME = r'^posts/[0-9a-f]{64}\.(jpg|webp)$'
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
@@ -73,7 +78,7 @@ class PostFormTests(TestCase):
             self.assertEqual(post.text, form_data['text'])
             self.assertEqual(post.group, self.group)
             self.assertEqual(post.author, self.user)
-            self.assertEqual(post.image.name, f'posts/{self.uploaded.name}')
+            self.assertRegex(post.image.name, IMAGE_NAME)
         response = self.client.post(
             reverse('posts:post_create'),
             data=form_data,
@@ -108,7 +113,7 @@ class PostFormTests(TestCase):
             self.assertEqual(post.text, form_data['text'])
             self.assertEqual(post.group, new_group)
             self.assertEqual(post.author, self.user)
-            self.assertEqual(post.image.name, f'posts/{self.uploaded.name}')
+            self.assertRegex(post.image.name, IMAGE_NAME)
         response = self.authorized_client.post(
             reverse('posts:post_edit', args=(self.group.pk,)),
             data=form_data,
@@ -176,3 +181,58 @@ class PostFormTests(TestCase):
                     label_template = response.context['form'][field].help_text
                     label_form = self.form[field].help_text
                     self.assertEqual(label_template, label_form)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @staticmethod
+    def get_image(size=(64, 48), fmt='JPEG', **options):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, fmt, **options)
+        return SimpleUploadedFile(
+            f'photo.{fmt.lower()}', buffer.getvalue(),
+            content_type=f'image/{fmt.lower()}')
+
+    def get_form(self, image):
+        return PostForm(data={'text': 'text'}, files={'image': image})
+
+    def test_image_reencoded(self):
+        """Картинка уменьшается и теряет EXIF"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        form = self.get_form(self.get_image(
+            size=(400, 300), exif=exif.tobytes()))
+        with self.settings(POST_IMAGE_MAX_SIZE=(100, 100)):
+            self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as stored:
+            self.assertEqual(stored.size, (100, 75))
+            self.assertFalse(stored.getexif())
+
+    def test_same_image_stored_once(self):
+        """Повторная загрузка той же картинки ссылается на тот же файл"""
+        user = models.User.objects.create_user(username='auth')
+        names = []
+        for _ in range(2):
+            form = self.get_form(self.get_image())
+            self.assertTrue(form.is_valid(), form.errors)
+            post = form.save(commit=False)
+            post.author = user
+            post.save()
+            names.append(post.image.name)
+        self.assertRegex(names[0], IMAGE_NAME)
+        self.assertEqual(names[0], names[1])
+
+    def test_limits(self):
+        """Слишком большие файлы и картинки отклоняются до декодирования"""
+        limits = (
+            ({'POST_IMAGE_MAX_BYTES': 100}, 'file_too_large'),
+            ({'POST_IMAGE_MAX_PIXELS': 1000}, 'too_many_pixels'),
+        )
+        for limit, code in limits:
+            with self.subTest(code=code), self.settings(**limit):
+                form = self.get_form(self.get_image())
+                self.assertFalse(form.is_valid())
+                self.assertTrue(form.has_error('image', code))
@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from sorl.thumbnail import default as sorl_default
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from posts import media
+from posts.thumbnails import thumbnail_name
+
+from .. import models
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = models.User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content=b'GIF89a'):
+        post = models.Post(text='text', author=self.user)
+        post.image.save('picture.gif', ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def references(self, post):
+        return models.MediaBlob.objects.get(name=post.image.name).references
+
+    def expire(self):
+        models.MediaBlob.objects.update(
+            updated=timezone.now() - timedelta(
+                seconds=settings.MEDIA_GC_GRACE + 1))
+
+    def test_same_content_stored_once(self):
+        """Одинаковые файлы хранятся один раз и считают ссылки"""
+        first, second = self.create_post(), self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.references(first), 2)
+        other = self.create_post(b'GIF89a-other')
+        self.assertNotEqual(other.image.name, first.image.name)
+
+    def test_references_follow_edits_and_deletes(self):
+        """Замена картинки и удаление поста снимают ссылку"""
+        post = self.create_post()
+        old_name = post.image.name
+        post.image.save('new.gif', ContentFile(b'GIF89a-new'), save=False)
+        post.save()
+        self.assertEqual(
+            models.MediaBlob.objects.get(name=old_name).references, 0)
+        self.assertEqual(self.references(post), 1)
+        post.delete()
+        self.assertFalse(
+            models.MediaBlob.objects.filter(references__gt=0).exists())
+
+    def test_collect_media(self):
+        """Файлы без ссылок удаляются вместе с миниатюрами после паузы"""
+        kept = self.create_post()
+        removed = self.create_post(b'GIF89a-removed')
+        name = removed.image.name
+        default_storage.save(thumbnail_name(name), ContentFile(b'thumb'))
+        removed.delete()
+        self.assertEqual(media.collect(), [])
+        self.expire()
+        call_command('collect_media', dry_run=True, stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
+        call_command('collect_media', stdout=StringIO())
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumbnail_name(name)))
+        self.assertTrue(default_storage.exists(kept.image.name))
+        self.assertEqual(self.references(kept), 1)
+
+    def test_reused_file_survives_collect(self):
+        """Файл, снова загруженный в форму, не удаляется до сохранения поста"""
+        post = self.create_post()
+        name = post.image.name
+        post.delete()
+        self.expire()
+        media.reserve(ContentFile(b'GIF89a', name='again.gif'))
+        self.assertEqual(media.collect(), [])
+        storage = models.Post._meta.get_field('image').storage
+        self.assertEqual(
+            storage.save('posts/again.gif', ContentFile(b'GIF89a')), name)
+        self.assertTrue(storage.exists(name))
+
+    def test_reserved_file_survives_collect_media(self):
+        """Старый файл, снова загруженный в форму, не удаляется как сирота"""
+        post = self.create_post()
+        name = self.age(post.image.name)
+        post.delete()
+        self.expire()
+        media.reserve(ContentFile(b'GIF89a', name='again.gif'))
+        call_command('collect_media', stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
+        self.expire()
+        call_command('collect_media', stdout=StringIO())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_recount(self):
+        """recount восстанавливает ссылки после массовой загрузки"""
+        post = self.create_post()
+        models.Post.objects.bulk_create([
+            models.Post(text='copy', author=self.user, image=post.image.name)
+        ])
+        models.MediaBlob.objects.all().delete()
+        media.recount()
+        self.assertEqual(self.references(post), 2)
+
+    def age(self, name):
+        stamp = time.time() - settings.MEDIA_GC_GRACE - 1
+        os.utime(default_storage.path(name), (stamp, stamp))
+        return name
+
+    def save_old_file(self, name):
+        return self.age(default_storage.save(name, ContentFile(b'data')))
+
+    def test_collect_orphans(self):
+        """Файлы, о которых не знает база, удаляются пачками"""
+        post = self.create_post()
+        models.Post.objects.filter(pk=post.pk).update(
+            thumbnail='thumbs/kept.jpg')
+        kept = [
+            self.age(post.image.name),
+            self.save_old_file('thumbs/kept.jpg'),
+            default_storage.save('posts/fresh.gif', ContentFile(b'new')),
+        ]
+        orphans = [
+            self.save_old_file('posts/orphan.gif'),
+            self.save_old_file('posts/nested/orphan.gif'),
+            self.save_old_file('thumbs/stale_100x100.jpg'),
+        ]
+        stdout = StringIO()
+        call_command('collect_media', dry_run=True, batch_size=1,
+                     verbosity=2, stdout=stdout)
+        for name in orphans:
+            self.assertIn(name, stdout.getvalue())
+            self.assertTrue(default_storage.exists(name))
+        self.assertIn('К удалению файлов: 3', stdout.getvalue())
+        self.assertEqual(media.collect_orphans(batch_size=2), 3)
+        for name in orphans:
+            self.assertFalse(default_storage.exists(name))
+        for name in kept:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_collect_sorl_thumbnails(self):
+        """Миниатюры sorl-thumbnail удаляются вместе с записями kvstore"""
+        name = default_storage.save(
+            'cache/ab/cd/abcd.jpg', ContentFile(b'thumb'))
+        kvstore = sorl_default.kvstore
+        key = f'{sorl_settings.THUMBNAIL_KEY_PREFIX}||image||abcd'
+        kvstore._set_raw(key, '{}')
+        self.assertEqual(media.collect_orphans(dry_run=True), 1)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(media.collect_orphans(), 1)
+        self.assertFalse(default_storage.exists(name))
+        self.assertIsNone(kvstore._get_raw(key))
@@ -1,4 +1,12 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts.formatting import FORMATTER_VERSION
 
 from .. import models
 
@@ -36,3 +44,131 @@ class TestModels(TestCase):
             self.assertEqual(
                 verbose_group,
                 str(models.Group._meta.verbose_name))
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена"""
+        follower = models.User.objects.create_user(username='follower')
+        models.Follow.objects.create(user=follower, author=self.user)
+        with self.assertRaises(IntegrityError):
+            models.Follow.objects.create(user=follower, author=self.user)
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = models.User.objects.create_user(username='author')
+        cls.reader = models.User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return models.AuthorStats.objects.get(author=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики обновляются при создании и удалении объектов"""
+        post = models.Post.objects.create(text='text', author=self.author)
+        comment = models.Comment.objects.create(
+            post=post, author=self.reader, text='comment')
+        follow = models.Follow.objects.create(
+            user=self.reader, author=self.author)
+        post.refresh_from_db()
+        with self.subTest():
+            self.assertEqual(self.stats(self.author).posts_count, 1)
+            self.assertEqual(self.stats(self.author).followers_count, 1)
+            self.assertEqual(self.stats(self.reader).following_count, 1)
+            self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        with self.subTest():
+            self.assertEqual(post.comments_count, 0)
+            self.assertEqual(self.stats(self.author).followers_count, 0)
+            self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_post_save_keeps_comments_count(self):
+        """Сохранение устаревшего экземпляра не затирает счётчик"""
+        post = models.Post.objects.create(text='text', author=self.author)
+        models.Comment.objects.create(
+            post=post, author=self.reader, text='comment')
+        post.text = 'edited'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_post_delete_does_not_load_post_per_comment(self):
+        """Удаление поста с комментариями не читает текст поста заново"""
+        post = models.Post.objects.create(text='text', author=self.author)
+        for _ in range(3):
+            models.Comment.objects.create(
+                post=post, author=self.reader, text='c')
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        self.assertFalse([
+            query['sql'] for query in queries
+            if '"posts_post"."text"' in query['sql']
+        ])
+        comment = models.Comment.objects.create(
+            post=models.Post.objects.create(text='text', author=self.author),
+            author=self.reader, text='comment')
+        comment.delete()
+        comment.post.refresh_from_db()
+        self.assertEqual(comment.post.comments_count, 0)
+
+    def test_save_renders_only_changed_text(self):
+        """Сохранение без текста не перерисовывает и не читает его"""
+        post = models.Post.objects.create(text='text', author=self.author)
+        with mock.patch.object(models.Post, 'render_text') as render:
+            post.save(update_fields=['group'])
+            deferred = models.Post.objects.defer('text').get(pk=post.pk)
+            with CaptureQueriesContext(connection) as queries:
+                deferred.save()
+        render.assert_not_called()
+        update = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "posts_post"'))
+        self.assertNotIn('"text"', update)
+        self.assertNotIn('"comments_count"', update)
+
+    def test_recount_command_fixes_drift(self):
+        """Команда recount_counters восстанавливает счётчики"""
+        post = models.Post.objects.create(text='text', author=self.author)
+        models.Comment.objects.create(
+            post=post, author=self.reader, text='comment')
+        models.AuthorStats.objects.all().delete()
+        models.Post.objects.update(comments_count=7)
+        call_command('recount_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+
+class RenderedTextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = models.User.objects.create_user(username='auth')
+
+    def test_html_rendered_on_save(self):
+        """HTML текста сохраняется вместе с постом и комментарием"""
+        post = models.Post.objects.create(
+            text='<b>one</b>\n\ntwo', author=self.user)
+        comment = models.Comment.objects.create(
+            post=post, author=self.user, text='line\nbreak')
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(
+            post.text_html, '<p>&lt;b&gt;one&lt;/b&gt;</p>\n\n<p>two</p>')
+        self.assertEqual(post.text_format, FORMATTER_VERSION)
+        self.assertEqual(comment.text_html, '<p>line<br>break</p>')
+        post.text = 'edited'
+        post.save(update_fields=('text',))
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<p>edited</p>')
+
+    def test_stale_html_rendered_on_the_fly(self):
+        """Устаревший HTML не показывается и обновляется командой"""
+        post = models.Post.objects.create(text='text', author=self.user)
+        models.Post.objects.update(text_html='<p>old</p>', text_format=0)
+        post.refresh_from_db()
+        self.assertEqual(post.rendered_text, '<p>text</p>')
+        call_command('rerender_texts', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<p>text</p>')
+        self.assertEqual(post.text_format, FORMATTER_VERSION)
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import models
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = models.User.objects.create_user(username='auth')
+        cls.group = models.Group.objects.create(title='title', slug='slug')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def posts(self):
+        return list(
+            models.Post.objects.order_by('pub_date')
+            .values_list('text', 'author__username', 'group__slug',
+                         'pub_date')
+        )
+
+    def test_export_import_round_trip(self):
+        """Выгрузка и загрузка постов сохраняют тексты, авторов и даты"""
+        models.Post.objects.create(
+            text='Первый, "с кавычками"\nи переносом', author=self.user,
+            group=self.group)
+        models.Post.objects.create(text='Второй', author=self.user)
+        expected = self.posts()
+        for name in ('posts.jsonl', 'posts.csv'):
+            with self.subTest(format=name):
+                call_command('export_posts', self.path(name),
+                             stdout=StringIO())
+                models.Post.objects.all().delete()
+                call_command('import_posts', self.path(name),
+                             stdout=StringIO(), stderr=StringIO())
+                self.assertEqual(self.posts(), expected)
+        self.assertEqual(
+            models.AuthorStats.objects.get(author=self.user).posts_count, 2)
+
+    def test_import_resolves_and_creates_references(self):
+        """Неизвестные авторы и группы пропускаются или создаются"""
+        with open(self.path('posts.jsonl'), 'w') as file:
+            file.write(
+                '{"text": "a", "author": "auth", "group": "slug",'
+                ' "pub_date": "2020-01-02T03:04:05+00:00"}\n'
+                '{"text": "b", "author": "new", "group": "new-group"}\n'
+                'not json\n'
+                '{"text": "c", "author": "auth", "pub_date": "вчера"}\n'
+            )
+        stderr = StringIO()
+        call_command('import_posts', self.path('posts.jsonl'),
+                     batch_size=2, stdout=StringIO(), stderr=stderr)
+        post = models.Post.objects.get()
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(
+            post.pub_date, datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(stderr.getvalue().count('Строка'), 3)
+
+        call_command('import_posts', self.path('posts.jsonl'),
+                     create_authors=True, create_groups=True,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(models.Post.objects.filter(
+            author__username='new', group__slug='new-group').exists())
+
+    def test_import_skips_malformed_records(self):
+        """Записи с несуществующей датой и не строковыми полями пропускаются"""
+        with open(self.path('posts.jsonl'), 'w') as file:
+            file.write(
+                '{"text": "a", "author": "auth",'
+                ' "pub_date": "2020-02-30T10:00:00"}\n'
+                '{"text": 5, "author": "auth"}\n'
+                '{"text": "b", "author": ["auth"]}\n'
+                '{"text": "c", "author": "auth", "image": {}}\n'
+                '{"text": "ok", "author": "auth"}\n'
+            )
+        stderr = StringIO()
+        call_command('import_posts', self.path('posts.jsonl'),
+                     stdout=StringIO(), stderr=stderr)
+        self.assertEqual(
+            list(models.Post.objects.values_list('text', flat=True)),
+            ['ok'])
+        for line_number in range(1, 5):
+            with self.subTest(line_number=line_number):
+                self.assertIn(f'Строка {line_number}', stderr.getvalue())
+
+    def test_import_copies_images(self):
+        """Картинки копируются в хранилище, пути за пределами каталога нет"""
+        with open(self.path('picture.gif'), 'wb') as file:
+            file.write(b'GIF89a')
+        with open(self.path('posts.csv'), 'w', newline='') as file:
+            file.write(
+                'text,author,group,pub_date,image\n'
+                'a,auth,,,picture.gif\n'
+                'b,auth,,,picture.gif\n'
+                'c,auth,,,../escape.gif\n'
+            )
+        stderr = StringIO()
+        call_command('import_posts', self.path('posts.csv'),
+                     images_from=self.directory, skip_thumbnails=True,
+                     stdout=StringIO(), stderr=stderr)
+        images = set(models.Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        name = images.pop()
+        self.assertRegex(name, r'^posts/[0-9a-f]{64}\.gif$')
+        self.assertTrue(os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name)))
+        self.assertIn('escape.gif', stderr.getvalue())
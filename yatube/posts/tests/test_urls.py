@@ -32,6 +32,8 @@ class PostURLTests(TestCase):
                 f'/posts/{cls.post.pk}/edit/')),
             ('posts:add_comment', (cls.post.pk,), (
                 f'/posts/{cls.post.pk}/comment/')),
+            ('posts:comment_list', (cls.post.pk,), (
+                f'/posts/{cls.post.pk}/comments/')),
             ('posts:follow_index', None, '/follow/'),
             ('posts:profile_follow', (cls.user.username,), (
                 f'/profile/{cls.user.username}/follow/')),
@@ -70,6 +72,8 @@ class PostURLTests(TestCase):
                 'posts/create_post.html')),
             ('posts:post_create', None, 'posts/create_post.html'),
             ('posts:follow_index', None, 'posts/follow.html'),
+            ('posts:comment_list', (self.post.pk,), (
+                'posts/comment_list.html')),
         )
         for name, args, template, in page_names_with_templates:
             with self.subTest(page_name=name):
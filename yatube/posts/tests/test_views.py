@@ -1,15 +1,26 @@
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 import shutil
 import tempfile
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.template import Context, Template
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from posts import comment_buffer
+from posts.formatting import EXCERPT_LENGTH
 from posts.forms import PostForm, CommentForm
+from posts.templatetags.post_cards import CARD_KEY, card_version
+from posts.thumbnails import generate_thumbnail, thumbnail_name
 
 from .. import models
 
@@ -133,6 +144,15 @@ class PostViewsTests(TestCase):
             reverse('posts:post_detail', args=(self.post.pk,)))
         self.correct_context(response, True)
 
+    def test_thumbnail_generated_ahead_of_render(self):
+        """Миниатюра строится заранее и подставляется в шаблон"""
+        name = generate_thumbnail(self.post.pk, self.post.image.name)
+        self.assertEqual(name, thumbnail_name(self.post.image.name))
+        self.assertTrue(default_storage.exists(name))
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertContains(response, default_storage.url(name))
+
     def test_post_detail_show_comments(self):
         """В шаблон post_detail передаются комменты к посту"""
         comment = models.Comment.objects.create(
@@ -154,6 +174,59 @@ class PostViewsTests(TestCase):
                 form_field = response.context['form'].fields[value]
                 self.assertIsInstance(form_field, expected)
 
+    @override_settings(COMMENTS_FIRST_PAGE=2, COMMENTS_PAGE_SIZE=2)
+    def test_post_detail_comments_paginated(self):
+        """Комментарии к посту загружаются порциями"""
+        for number in range(5):
+            models.Comment.objects.create(
+                post=self.post, author=self.user, text=f'comment-{number}')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 2)
+        self.assertTrue(comments.has_next())
+        self.assertEqual(response.context['post'].comments_count, 5)
+        seen = [comment.text for comment in comments]
+        url = reverse('posts:comment_list', args=(self.post.pk,))
+        while comments.has_next():
+            response = self.client.get(
+                url, {'cursor': comments.next_cursor},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertTemplateNotUsed(response, 'base.html')
+            comments = response.context['comments']
+            seen += [comment.text for comment in comments]
+        self.assertEqual(
+            seen, [f'comment-{number}' for number in reversed(range(5))])
+
+    @override_settings(QUERY_PROFILING=True, QUERY_BUDGET_STRICT=True)
+    def test_views_fit_query_budgets(self):
+        """Страницы укладываются в бюджет SQL-запросов"""
+        models.Follow.objects.create(user=self.user, author=self.user)
+        for number in range(settings.SLICE):
+            post = models.Post.objects.create(
+                text='text', author=self.user, group=self.group)
+            models.Comment.objects.create(
+                post=post, author=self.user, text='comment')
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(post.pk,)),
+            reverse('posts:comment_list', args=(post.pk,)),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=text',
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', args=(self.group.slug,)),
+            reverse('posts:api_profile', args=(self.user.username,)),
+            reverse('posts:api_post_detail', args=(post.pk,)),
+            reverse('posts:api_follow_index'),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                cache.clear()
+                response = self.authorized_client.get(page)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
     def test_post_create_or_edit_show_correct_context(self):
         """Шаблон post_create и post_edit сформированы с верным контекстом"""
         page_names = (
@@ -241,6 +314,67 @@ class PaginatorViewsTest(TestCase):
                         self.assertEqual(
                             len(response.context['page_obj']), posts_amt)
 
+    def test_cursor_pages_cover_all_records(self):
+        """Курсорная пагинация выдаёт все посты без повторов"""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        response = self.client.get(url + '?cursor=')
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), settings.SLICE)
+        self.assertFalse(first_page.has_previous())
+        models.Post.objects.create(text='new', author=self.user,
+                                   group=self.group)
+        response = self.client.get(url + f'?cursor={first_page.next_cursor}')
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), COUNT_POST - settings.SLICE)
+        self.assertFalse(second_page.has_next())
+        seen = [post.pk for post in list(first_page) + list(second_page)]
+        self.assertEqual(len(set(seen)), COUNT_POST)
+        response = self.client.get(
+            url + f'?cursor={second_page.previous_cursor}')
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [post.pk for post in first_page])
+
+    def test_broken_cursor_opens_first_page(self):
+        """Битый курсор открывает первую страницу"""
+        url = reverse('posts:profile', args=(self.user.username,))
+        for cursor in ('garbage', 'WyJuZXh0IiwgWyJ4IiwgMV1d'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(url + f'?cursor={cursor}')
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(
+                    len(response.context['page_obj']), settings.SLICE)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_LIMIT=5, BACKGROUND_WORKERS=0)
+    def test_long_list_count_is_cached(self):
+        """Число постов длинного списка берётся из кеша и обновляется"""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, COUNT_POST)
+        models.Post.objects.create(text='new', author=self.user)
+        response = self.client.get(url + '?page=2')
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, COUNT_POST)
+        with override_settings(PAGINATOR_COUNT_REFRESH=-1):
+            self.client.get(url + '?page=2')
+        response = self.client.get(url + '?page=2')
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, COUNT_POST + 1)
+
+    def test_page_links_are_windowed(self):
+        """Паджинатор показывает только края и соседей текущей страницы"""
+        for text in range(COUNT_POST, settings.SLICE * 12):
+            models.Post.objects.create(text=str(text), author=self.user)
+        response = self.client.get(reverse('posts:index') + '?page=6')
+        self.assertEqual(
+            response.context['page_obj'].paginator.num_pages, 12)
+        for page in (1, 4, 5, 7, 8, 12):
+            self.assertContains(response, f'href="?page={page}"')
+        for page in (2, 3, 9, 10, 11):
+            self.assertNotContains(response, f'href="?page={page}"')
+        self.assertContains(response, '&hellip;', count=2)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class CachingViewsTests(TestCase):
@@ -260,7 +394,8 @@ class CachingViewsTests(TestCase):
             author=self.user,
         )
         response1 = self.client.get(reverse('posts:index'))
-        post.delete()
+        models.Post.objects.filter(pk=post.pk).update(
+            text='changed_text', text_format=0)
         response2 = self.client.get(reverse('posts:index'))
         self.assertEqual(response2.content, response1.content)
         cache.clear()
@@ -278,9 +413,504 @@ class CachingViewsTests(TestCase):
         self.authorized_client.force_login(folower)
 
         response1 = self.authorized_client.get(reverse('posts:follow_index'))
-        post.delete()
+        models.Post.objects.filter(pk=post.pk).update(
+            text='changed_text', text_format=0)
         response2 = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertEqual(response2.content, response1.content)
         cache.clear()
         response3 = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotEqual(response3.content, response1.content)
+
+    def test_feed_cache_invalidated_on_post_changes(self):
+        """Кеш лент сбрасывается при сохранении и удалении поста"""
+        group = models.Group.objects.create(title='title', slug='slug')
+        post = models.Post.objects.create(
+            text='cached_text', author=self.user, group=group)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        for url in urls:
+            self.client.get(url)
+        post.text = 'edited_text'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'edited_text')
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'edited_text')
+
+    def test_feed_cache_varies_by_page(self):
+        """Разные страницы ленты кешируются под разными ключами"""
+        for text in range(settings.SLICE + 1):
+            models.Post.objects.create(text=f'post-{text}', author=self.user)
+        response1 = self.client.get(reverse('posts:index'))
+        response2 = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertContains(response1, 'post-10')
+        self.assertNotContains(response2, 'post-10')
+        self.assertContains(response2, 'post-0')
+
+    def test_public_pages_conditional_get(self):
+        """Анонимам страницы отдаются с валидаторами и ответом 304"""
+        group = models.Group.objects.create(title='title', slug='slug')
+        post = models.Post.objects.create(
+            text='text', author=self.user, group=group)
+        urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', args=(group.slug,)),
+            'posts:profile': reverse(
+                'posts:profile', args=(self.user.username,)),
+            'posts:post_detail': reverse(
+                'posts:post_detail', args=(post.pk,)),
+        }
+        etags = {}
+        for name, url in urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn(
+                    f'max-age={settings.PUBLIC_PAGE_MAX_AGE[name]}',
+                    response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                self.assertIn('Last-Modified', response)
+                etags[url] = response['ETag']
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+        models.Comment.objects.create(
+            post=post, author=self.user, text='comment')
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_follow_changes_profile_etag(self):
+        """Подписка меняет ETag профиля со счётчиком подписчиков"""
+        url = reverse('posts:profile', args=(self.user.username,))
+        etag = self.client.get(url)['ETag']
+        follower = models.User.objects.create_user(username='follower')
+        models.Follow.objects.create(user=follower, author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_authorized_pages_are_private(self):
+        """Страницы вошедших пользователей не кешируются общими кешами"""
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('ETag', response)
+
+
+class PostCardsTests(TestCase):
+    TEMPLATE = Template(
+        '{% load post_cards %}{% post_cards posts as cards %}'
+        '{% for card in cards %}{{ card }}{% endfor %}')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = models.User.objects.create_user(username='user.name+1@x')
+        cls.group = models.Group.objects.create(title='title', slug='slug')
+        cls.post = models.Post.objects.create(
+            text='text', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, **context):
+        posts = models.Post.objects.select_related('author', 'group')
+        return self.TEMPLATE.render(Context({'posts': posts, **context}))
+
+    def test_card_links(self):
+        """Ссылки карточки совпадают с reverse()"""
+        html = self.render()
+        for url in (
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:group_list', args=(self.group.slug,)),
+        ):
+            with self.subTest(url=url):
+                self.assertIn(f'href="{url}"', html)
+        self.assertNotIn('href="/group/', self.render(group=self.group))
+
+    def test_cards_cached_until_post_changes(self):
+        """Карточка берётся из кеша, пока пост не изменился"""
+        self.render()
+        key = CARD_KEY.format(
+            self.post.pk, card_version(self.post, True, True))
+        self.assertIsNotNone(cache.get(key))
+        cache.set(key, '<p>cached</p>')
+        self.assertIn('cached', self.render())
+        self.post.text = 'changed'
+        self.post.save()
+        html = self.render()
+        self.assertNotIn('cached', html)
+        self.assertIn('changed', html)
+
+    def test_stale_texts_loaded_in_one_query(self):
+        """Устаревший HTML в ленте не даёт запроса на каждую карточку"""
+        def index_queries():
+            models.Post.objects.update(text_format=0)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('posts:index'))
+            self.assertContains(response, 'text')
+            return len(queries)
+
+        single = index_queries()
+        for _ in range(3):
+            models.Post.objects.create(text='text', author=self.user)
+        self.assertEqual(index_queries(), single)
+
+    def test_long_post_shows_excerpt(self):
+        """Лента показывает начало длинного поста и ссылку на него"""
+        ending = 'конец-текста'
+        long_post = models.Post.objects.create(
+            text='слово ' * EXCERPT_LENGTH + ending, author=self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('posts:index'))
+        html = response.content.decode()
+        self.assertNotIn(ending, html)
+        self.assertIn('Читать дальше', html)
+        self.assertIn(
+            f'href="{reverse("posts:post_detail", args=(long_post.pk,))}"',
+            html)
+        self.assertEqual(html.count('Читать дальше'), 1)
+
+
+@override_settings(
+    COMMENT_BUFFER=True, COMMENT_BUFFER_INTERVAL=60, BACKGROUND_WORKERS=0)
+class CommentBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = models.User.objects.create_user(username='auth')
+        cls.reader = models.User.objects.create_user(username='reader')
+        cls.post = models.Post.objects.create(text='text', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(comment_buffer.flush)
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    def comment(self, text):
+        self.author_client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            data={'text': text})
+
+    def test_buffered_comment_visible_to_author(self):
+        """Автор сразу видит комментарий, который ещё ждёт записи"""
+        self.comment('buffered')
+        self.assertFalse(models.Comment.objects.exists())
+        self.assertContains(self.author_client.get(self.url), 'buffered')
+        self.assertNotContains(self.reader_client.get(self.url), 'buffered')
+        self.assertEqual(comment_buffer.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertContains(
+            self.author_client.get(self.url), 'buffered', count=1)
+        self.assertContains(self.reader_client.get(self.url), 'buffered')
+
+    def test_repeated_comments_visible_to_author(self):
+        """Одинаковые комментарии не прячут друг друга до записи"""
+        self.comment('same')
+        self.comment('same')
+        models.Comment.objects.create(
+            post=self.post, author=self.user, text='same')
+        self.assertContains(
+            self.author_client.get(self.url), 'same', count=3)
+        self.assertEqual(comment_buffer.flush(), 2)
+        self.assertEqual(comment_buffer.pending_comments(
+            self.post.pk, self.user), [])
+        self.assertContains(
+            self.author_client.get(self.url), 'same', count=3)
+
+    def test_create_form_takes_no_write_lock(self):
+        """Показ формы нового поста не открывает транзакцию"""
+        with CaptureQueriesContext(connection) as queries:
+            self.author_client.get(reverse('posts:post_create'))
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].startswith(('BEGIN', 'SAVEPOINT'))
+        ])
+
+    def test_buffered_comment_takes_no_write_lock(self):
+        """Запрос с буферизованным комментарием не открывает транзакцию"""
+        with CaptureQueriesContext(connection) as queries:
+            self.comment('buffered')
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].startswith(('BEGIN', 'SAVEPOINT'))
+        ])
+
+    def test_full_buffer_flushed(self):
+        """Полная очередь записывается одним bulk_create"""
+        with self.settings(COMMENT_BUFFER_BATCH=3):
+            for number in range(3):
+                self.comment(f'comment-{number}')
+        self.assertEqual(
+            models.Comment.objects.filter(post=self.post).count(), 3)
+        self.assertEqual(comment_buffer.flush(), 0)
+
+    def test_failed_batch_retried(self):
+        """Пачка, которую не удалось записать, не теряется"""
+        self.comment('first')
+        self.comment('second')
+        locked = OperationalError('database is locked')
+        with self.settings(COMMENT_BUFFER_RETRIES=2), \
+                mock.patch.object(comment_buffer, '_write',
+                                  side_effect=locked):
+            with self.assertLogs('posts.comment_buffer', 'ERROR'):
+                self.assertEqual(comment_buffer.flush(), 0)
+            self.assertFalse(models.Comment.objects.exists())
+            with self.assertLogs('posts.comment_buffer', 'ERROR'):
+                self.assertEqual(comment_buffer.flush(), 2)
+        self.assertEqual(
+            sorted(models.Comment.objects.values_list('text', flat=True)),
+            ['first', 'second'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(comment_buffer.flush(), 0)
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = models.User.objects.create_user(username='author')
+        cls.reader = models.User.objects.create_user(username='reader')
+        cls.old_post = models.Post.objects.create(
+            text='old', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_follow_delivers_posts(self):
+        """Подписка и новые посты попадают в материализованную ленту"""
+        models.Follow.objects.create(user=self.reader, author=self.author)
+        new_post = models.Post.objects.create(text='new', author=self.author)
+        self.assertEqual(self.reader.feed_entries.count(), 2)
+        self.assertEqual(self.feed(), [new_post.pk, self.old_post.pk])
+
+    def test_unfollow_clears_feed(self):
+        """Отписка убирает посты автора из ленты"""
+        models.Follow.objects.create(user=self.reader, author=self.author)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,)))
+        self.assertFalse(self.reader.feed_entries.exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_read_on_demand(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении"""
+        models.Follow.objects.create(user=self.reader, author=self.author)
+        new_post = models.Post.objects.create(text='new', author=self.author)
+        self.assertFalse(self.reader.feed_entries.exists())
+        self.assertEqual(self.feed(), [new_post.pk, self.old_post.pk])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_author_back_under_limit_delivered(self):
+        """Посты автора, снова не популярного, раскладываются по лентам"""
+        other = models.User.objects.create_user(username='other')
+        models.Follow.objects.create(user=self.reader, author=self.author)
+        models.Follow.objects.create(user=other, author=self.author)
+        new_post = models.Post.objects.create(text='new', author=self.author)
+        self.assertFalse(self.reader.feed_entries.filter(
+            post=new_post).exists())
+        models.Follow.objects.get(user=other).delete()
+        self.assertEqual(
+            set(self.reader.feed_entries.values_list('post', flat=True)),
+            {new_post.pk, self.old_post.pk},
+        )
+        self.assertEqual(self.feed(), [new_post.pk, self.old_post.pk])
+
+    @override_settings(FEED_BACKFILL_LIMIT=1)
+    def test_rebuild_feeds(self):
+        """rebuild_feeds раскладывает последние посты непопулярных авторов"""
+        models.Follow.objects.create(user=self.reader, author=self.author)
+        new_post = models.Post.objects.create(text='new', author=self.author)
+        models.FeedEntry.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(
+            list(self.reader.feed_entries.values_list('post', flat=True)),
+            [new_post.pk],
+        )
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            call_command('rebuild_feeds', stdout=StringIO())
+        self.assertFalse(self.reader.feed_entries.exists())
+
+
+class SearchViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = models.User.objects.create_user(username='auth')
+        cls.group = models.Group.objects.create(title='title', slug='slug')
+        cls.best = models.Post.objects.create(
+            text='Кот, кот!', author=cls.user, group=cls.group)
+        cls.other = models.Post.objects.create(
+            text='Просто кот, а не собака', author=cls.user)
+        models.Post.objects.create(text='Собака', author=cls.user)
+
+    def found(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return [post.pk for post in response.context['page_obj']]
+
+    def check_backend(self):
+        self.assertEqual(self.found(q='КОТ'), [self.best.pk, self.other.pk])
+        self.assertEqual(
+            self.found(q='кот', group=self.group.slug), [self.best.pk])
+        self.assertEqual(
+            self.found(q='кот', order='new'), [self.other.pk, self.best.pk])
+        self.assertEqual(self.found(q='кот собака'), [self.other.pk])
+        self.assertEqual(self.found(q='кот мышь'), [])
+
+    def test_search_fts(self):
+        """Поиск через FTS5 находит и ранжирует посты"""
+        with self.settings(SEARCH_BACKEND='fts5'):
+            call_command('rebuild_search_index', stdout=StringIO())
+            self.check_backend()
+
+    def test_search_term_index(self):
+        """Поиск через собственный индекс находит и ранжирует посты"""
+        with self.settings(SEARCH_BACKEND='terms'):
+            call_command('rebuild_search_index', stdout=StringIO())
+            self.check_backend()
+
+    def test_search_folds_yo(self):
+        """Ё и е в тексте и запросе не различаются"""
+        tree = models.Post.objects.create(
+            text='Ёлка зелёная стоит', author=self.user)
+        for backend in ('fts5', 'terms'):
+            with self.subTest(backend=backend), \
+                    self.settings(SEARCH_BACKEND=backend):
+                if backend == 'fts5':
+                    # Пост проиндексирован сигналом при сохранении.
+                    self.assertEqual(self.found(q='ёлка'), [tree.pk])
+                call_command('rebuild_search_index', stdout=StringIO())
+                for query in ('ёлка', 'елка', 'ЗЕЛЁНАЯ', 'зеленая'):
+                    self.assertEqual(self.found(q=query), [tree.pk])
+
+    def test_search_keyset_pages(self):
+        """Результаты поиска листаются курсором без повторов"""
+        for backend in ('fts5', 'terms'):
+            with self.subTest(backend=backend), \
+                    self.settings(SEARCH_BACKEND=backend):
+                call_command('rebuild_search_index', stdout=StringIO())
+                for number in range(settings.SLICE):
+                    models.Post.objects.create(
+                        text=f'кот {number}', author=self.user)
+                response = self.client.get(
+                    reverse('posts:search'), {'q': 'кот'})
+                page_obj = response.context['page_obj']
+                response = self.client.get(
+                    reverse('posts:search'),
+                    {'q': 'кот', 'cursor': page_obj.next_cursor})
+                seen = [post.pk for post in page_obj]
+                seen += [post.pk for post in response.context['page_obj']]
+                self.assertEqual(len(seen), settings.SLICE + 2)
+                self.assertEqual(len(set(seen)), settings.SLICE + 2)
+                self.assertEqual(seen[0], self.best.pk)
+                models.Post.objects.filter(text__startswith='кот ').delete()
+
+
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = models.User.objects.create_user(username='auth')
+        cls.reader = models.User.objects.create_user(username='reader')
+        cls.group = models.Group.objects.create(title='title', slug='slug')
+        cls.posts = [
+            models.Post.objects.create(
+                text=f'post-{number}', author=cls.user, group=cls.group)
+            for number in range(5)
+        ]
+        models.Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def collect(self, url, client=None):
+        """Идёт по ссылкам next и собирает id постов всех страниц"""
+        client = client or self.client
+        seen = []
+        while url:
+            data = client.get(url).json()
+            seen += [post['id'] for post in data['results']]
+            url = data['next']
+        return seen
+
+    def test_api_feeds(self):
+        """API отдаёт ленты страницами по курсору"""
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        expected = [post.pk for post in reversed(self.posts)]
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', args=(self.group.slug,)),
+            reverse('posts:api_profile', args=(self.user.username,)),
+            reverse('posts:api_follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.collect(url + '?limit=2', reader_client), expected)
+        post = self.client.get(reverse('posts:api_index')).json()[
+            'results'][0]
+        self.assertEqual(post['author'], 'auth')
+        self.assertEqual(post['group'], 'slug')
+        self.assertEqual(post['text'], 'post-4')
+        self.assertIsNone(post['image'])
+        response = self.client.get(reverse('posts:api_follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_api_post_detail(self):
+        """API поста отдаёт пост и первую страницу комментариев"""
+        post = self.posts[0]
+        models.Comment.objects.create(
+            post=post, author=self.reader, text='comment')
+        data = self.client.get(
+            reverse('posts:api_post_detail', args=(post.pk,))).json()
+        self.assertEqual(data['post']['comments_count'], 1)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']['results']],
+            ['comment'])
+        response = self.client.get(
+            reverse('posts:api_post_detail', args=(0,)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_api_conditional_get(self):
+        """Неизменившаяся лента отдаётся ответом 304 без запросов к базе"""
+        url = reverse('posts:api_index')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+        post = self.posts[0]
+        detail = reverse('posts:api_post_detail', args=(post.pk,))
+        detail_etag = self.client.get(detail)['ETag']
+        post.text = 'changed'
+        post.save()
+        for page, old_etag in ((url, etag), (detail, detail_etag)):
+            with self.subTest(page=page):
+                response = self.client.get(page, HTTP_IF_NONE_MATCH=old_etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], old_etag)
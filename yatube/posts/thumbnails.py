@@ -0,0 +1,86 @@
+"""Заранее рассчитанные миниатюры картинок постов.
+
+Миниатюра строится в фоне после сохранения поста и кладётся по
+предсказуемому пути рядом с другими миниатюрами, а её имя записывается
+в Post.thumbnail. Пока миниатюры нет, шаблоны показывают оригинал.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core.tasks import submit_on_commit
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_DIR = 'thumbs'
+
+
+def thumbnail_name(image_name):
+    """Путь миниатюры однозначно выводится из пути оригинала."""
+    width, height = settings.POST_THUMBNAIL_SIZE
+    stem = os.path.splitext(image_name)[0]
+    return f'{THUMBNAILS_DIR}/{stem}_{width}x{height}.jpg'
+
+
+def needs_thumbnail(post):
+    if not post.image:
+        return False
+    return post.thumbnail.name != thumbnail_name(post.image.name)
+
+
+def render_thumbnail(source):
+    """Кадрирует картинку по центру до размера миниатюры."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image = ImageOps.fit(
+            image, settings.POST_THUMBNAIL_SIZE, Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(
+        buffer, 'JPEG',
+        quality=settings.POST_THUMBNAIL_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def build_thumbnail(image_name):
+    """Кладёт миниатюру картинки в хранилище, если её там ещё нет."""
+    name = thumbnail_name(image_name)
+    if default_storage.exists(name):
+        return name
+    try:
+        with default_storage.open(image_name) as source:
+            content = render_thumbnail(source)
+    except (OSError, ValueError) as error:
+        logger.warning('Cannot build thumbnail for %s: %s',
+                       image_name, error)
+        return None
+    return default_storage.save(name, content)
+
+
+def generate_thumbnail(post_pk, image_name):
+    """Строит миниатюру и привязывает её к посту, если картинка та же."""
+    name = build_thumbnail(image_name)
+    if name is None:
+        return None
+    updated = Post.objects.filter(pk=post_pk, image=image_name).update(
+        thumbnail=name)
+    post = Post.objects.only('author_id', 'group_id').filter(pk=post_pk)
+    if updated and post.exists():
+        caching.bump(*caching.post_scopes(post.get()))
+    return name
+
+
+def schedule_thumbnail(post):
+    """Ставит построение миниатюры в очередь после коммита."""
+    if post.thumbnail and (not post.image or needs_thumbnail(post)):
+        Post.objects.filter(pk=post.pk).update(thumbnail='')
+        post.thumbnail = ''
+    if needs_thumbnail(post):
+        submit_on_commit(generate_thumbnail, post.pk, post.image.name)
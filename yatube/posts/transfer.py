@@ -0,0 +1,252 @@
+"""Потоковые импорт и экспорт постов в JSON Lines и CSV.
+
+Файл читается и пишется построчно, в памяти держится одна пачка постов
+и словари username -> pk и slug -> pk, поэтому объём выгрузки ограничен
+только диском. Каждая пачка сохраняется одним bulk_create в своей
+транзакции; сигналы при этом не срабатывают, и после загрузки ленты,
+счётчики и поисковый индекс пересобираются finish_bulk_load().
+"""
+import csv
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import media
+from .bulk import explicit_dates
+from .models import Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+FIELDS = ('text', 'author', 'group', 'pub_date', 'image')
+EXPORT_COLUMNS = (
+    'text', 'author__username', 'group__slug', 'pub_date', 'image')
+IMAGES_DIR = 'posts'
+
+COPIED_IMAGES_LIMIT = 10000
+
+# Ограничение SQLite на число параметров в одном запросе.
+LOOKUP_CHUNK = 500
+
+
+class RecordError(ValueError):
+    pass
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def export_posts(stream, fmt, queryset=None, chunk_size=2000):
+    """Пишет посты в поток, не загружая таблицу в память."""
+    queryset = Post.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('pk').values_list(*EXPORT_COLUMNS).iterator(
+        chunk_size=chunk_size)
+    writer = csv.writer(stream) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(FIELDS)
+    exported = 0
+    for text, author, group, pub_date, image in rows:
+        record = (text, author, group or '', pub_date.isoformat(), image)
+        if writer:
+            writer.writerow(record)
+        else:
+            stream.write(json.dumps(
+                dict(zip(FIELDS, record)), ensure_ascii=False) + '\n')
+        exported += 1
+    return exported
+
+
+def read_records(stream, fmt):
+    """Отдаёт (номер строки, словарь полей) по одной записи."""
+    if fmt == 'csv':
+        csv.field_size_limit(sys.maxsize)
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield line_number, RecordError(f'некорректный JSON: {error}')
+            continue
+        if not isinstance(record, dict):
+            yield line_number, RecordError('ожидался объект')
+            continue
+        yield line_number, record
+
+
+def _check_types(record):
+    """Запись, если все её поля — строки, иначе RecordError."""
+    if not isinstance(record, dict):
+        return record
+    for field in FIELDS:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            return RecordError(f'поле {field!r} должно быть строкой')
+    return record
+
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        # Формат верный, но такой даты нет, например 30 февраля.
+        parsed = None
+    if parsed is None:
+        raise RecordError(f'некорректная дата {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class PostImporter:
+    """Загружает записи пачками, разрешая авторов и группы по словарям."""
+
+    def __init__(self, batch_size=2000, create_authors=False,
+                 create_groups=False, images_from=None, workers=8,
+                 log=None):
+        self.batch_size = batch_size
+        self.create_authors = create_authors
+        self.create_groups = create_groups
+        self.images_from = images_from
+        self.workers = workers
+        self.log = log or (lambda message: None)
+        self.authors = {}
+        self.groups = {}
+        self.copied = OrderedDict()
+        self.imported = 0
+        self.errors = []
+        self.now = timezone.now()
+
+    def _resolve(self, names, lookup, queryset, field, create):
+        missing = sorted({name for name in names if name} - lookup.keys())
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            chunk = missing[start:start + LOOKUP_CHUNK]
+            lookup.update(
+                queryset.filter(**{f'{field}__in': chunk})
+                .values_list(field, 'pk'))
+            absent = [name for name in chunk if name not in lookup]
+            if absent and create:
+                create(absent)
+                lookup.update(
+                    queryset.filter(**{f'{field}__in': absent})
+                    .values_list(field, 'pk'))
+
+    def _create_authors(self, usernames):
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(username=username, password=password)
+            for username in usernames)
+
+    def _create_groups(self, slugs):
+        Group.objects.bulk_create(
+            Group(title=slug, slug=slug) for slug in slugs)
+
+    def _copy_image(self, name):
+        root = os.path.realpath(self.images_from)
+        source = os.path.realpath(os.path.join(root, name))
+        if not source.startswith(root + os.sep):
+            return RecordError(f'картинка {name!r} вне каталога картинок')
+        try:
+            with open(source, 'rb') as image:
+                return Post._meta.get_field('image').storage.save(
+                    f'{IMAGES_DIR}/{os.path.basename(name)}', File(image))
+        except OSError as error:
+            return RecordError(f'картинка {name!r} не скопирована: {error}')
+
+    def _copy_images(self, records, executor):
+        """Копирует картинки пачки в хранилище в несколько потоков."""
+        names = {record.get('image') for record in records} - {None, ''}
+        if not self.images_from:
+            return {name: name for name in names}
+        # Одна картинка у многих постов копируется один раз; память под
+        # уже скопированные имена ограничена COPIED_IMAGES_LIMIT.
+        pending = [name for name in names if name not in self.copied]
+        self.copied.update(zip(pending, executor.map(
+            self._copy_image, pending)))
+        # Хранилище в базу не пишет: запись о файле обновляется здесь, в
+        # транзакции пачки, чтобы collect() не удалил уже лежавший файл.
+        for name in pending:
+            if not isinstance(self.copied[name], Exception):
+                media.touch(self.copied[name])
+        images = {name: self.copied[name] for name in names}
+        for name in names:
+            self.copied.move_to_end(name)
+        while len(self.copied) > COPIED_IMAGES_LIMIT:
+            self.copied.popitem(last=False)
+        return images
+
+    def _build(self, record, images):
+        if isinstance(record, Exception):
+            raise record
+        image = images.get(record.get('image'), '')
+        if isinstance(image, Exception):
+            raise image
+        author = record.get('author')
+        if author not in self.authors:
+            raise RecordError(f'неизвестный автор {author!r}')
+        group = record.get('group') or None
+        if group is not None and group not in self.groups:
+            raise RecordError(f'неизвестная группа {group!r}')
+        text = record.get('text')
+        if not text:
+            raise RecordError('пустой текст')
+        post = Post(
+            text=text,
+            author_id=self.authors[author],
+            group_id=self.groups.get(group),
+            pub_date=_parse_date(record.get('pub_date'), self.now),
+            image=image,
+        )
+        post.render_text()
+        return post
+
+    def import_batch(self, batch, executor):
+        batch = [
+            (line_number, _check_types(record))
+            for line_number, record in batch
+        ]
+        records = [record for _, record in batch if isinstance(record, dict)]
+        self._resolve(
+            (record.get('author') for record in records), self.authors,
+            User.objects, 'username',
+            self.create_authors and self._create_authors)
+        self._resolve(
+            (record.get('group') for record in records), self.groups,
+            Group.objects, 'slug',
+            self.create_groups and self._create_groups)
+        images = self._copy_images(records, executor)
+        posts = []
+        for line_number, record in batch:
+            try:
+                posts.append(self._build(record, images))
+            except RecordError as error:
+                self.errors.append((line_number, str(error)))
+        Post.objects.bulk_create(posts)
+        self.imported += len(posts)
+
+    def run(self, records):
+        records = iter(records)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                explicit_dates(Post, 'pub_date'):
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.import_batch(batch, executor)
+                self.log(f'Загружено постов: {self.imported}')
+        return self.imported
@@ -0,0 +1,93 @@
+"""Обработка картинок, загружаемых к постам.
+
+Загрузка пишется во временный файл на диске (TemporaryFileUploadHandler),
+а размер файла и число пикселей проверяются по заголовку до
+декодирования. Затем картинка уменьшается до POST_IMAGE_MAX_SIZE и
+перекодируется без метаданных EXIF. Имя файлу по хешу содержимого даёт
+хранилище поля Post.image (ContentAddressedStorage).
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, features
+
+# Формат Pillow -> (модуль или кодек для features.check, расширение).
+FORMATS = {
+    'WEBP': ('webp', 'webp'),
+    'JPEG': ('jpg', 'jpg'),
+}
+
+
+def output_format():
+    """Первый из POST_IMAGE_FORMATS, который умеет сохранять Pillow."""
+    for name in settings.POST_IMAGE_FORMATS:
+        feature, _ = FORMATS[name]
+        if features.check(feature):
+            return name
+    raise ValueError('Pillow cannot save any of POST_IMAGE_FORMATS')
+
+
+def _open(upload):
+    """Открывает картинку, прочитав только заголовок."""
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)},
+            code='file_too_large',
+        )
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось прочитать картинку.', code='invalid_image')
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка %(width)s×%(height)s слишком большая.',
+            params={'width': width, 'height': height},
+            code='too_many_pixels',
+        )
+    return image
+
+
+def _convert(image, fmt):
+    """Приводит режим к поддерживаемому форматом, сохраняя прозрачность."""
+    transparent = (
+        image.mode in ('RGBA', 'LA') or 'transparency' in image.info)
+    if not transparent:
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    if fmt != 'JPEG':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def process_image(upload):
+    """Проверяет и перекодирует загрузку; возвращает ContentFile."""
+    fmt = output_format()
+    image = _open(upload)
+    icc_profile = image.info.get('icc_profile')
+    try:
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', settings.POST_IMAGE_MAX_SIZE)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(settings.POST_IMAGE_MAX_SIZE, Image.LANCZOS)
+        image = _convert(image, fmt)
+        buffer = BytesIO()
+        options = {'quality': settings.POST_IMAGE_QUALITY}
+        if fmt == 'JPEG':
+            options.update(optimize=True, progressive=True)
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        image.save(buffer, fmt, **options)
+    except (OSError, ValueError):
+        raise ValidationError(
+            'Не удалось обработать картинку.', code='invalid_image')
+    _, extension = FORMATS[fmt]
+    return ContentFile(buffer.getvalue(), name=f'image.{extension}')
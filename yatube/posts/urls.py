@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 
 app_name = 'posts'
@@ -10,10 +10,21 @@ urlpatterns = (
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/',
+         views.comment_list,
+         name='comment_list'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
     path('create/', views.post_create, name='post_create'),
+    path('search/', views.search, name='search'),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/posts/<int:post_id>/',
+         api.post_detail,
+         name='api_post_detail'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
     path('', views.index, name='index'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
@@ -1,8 +1,261 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import time
+from collections.abc import Sequence
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
 from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+from core.tasks import submit
+
+from .models import Comment
+
+FORWARD = 'next'
+BACKWARD = 'prev'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Сохраняет микросекунды, которые DjangoJSONEncoder отбрасывает."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = json.dumps([direction, values], cls=CursorEncoder)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора. Для битого токена возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+    if direction not in (FORWARD, BACKWARD) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class KeysetPage(Sequence):
+    """Страница курсорной пагинации с интерфейсом, похожим на Page."""
+    is_cursor = True
+    number = None
+
+    def __init__(self, object_list, paginator, cursor='',
+                 has_next=False, has_previous=False):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage {self.cursor or "first"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1], FORWARD)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0], BACKWARD)
+
+
+class KeysetPaginator:
+    """Пагинация по ключу сортировки вместо LIMIT/OFFSET.
+
+    Каждая страница выбирается одним запросом с условием «строго после
+    (или до) ключа курсора», поэтому стоимость не зависит от глубины
+    страницы, а вставка новых записей не сдвигает уже выданные страницы.
+    Последнее поле сортировки должно быть уникальным.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-pk')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    @property
+    def fields(self):
+        return tuple(name.lstrip('-') for name in self.ordering)
+
+    def cursor_for(self, item, direction):
+        if isinstance(item, dict):
+            values = [item[name] for name in self.fields]
+        else:
+            values = [getattr(item, name) for name in self.fields]
+        return encode_cursor(direction, values)
+
+    def _after(self, values, reverse=False):
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != reverse
+            lookup = f'{field}__{"lt" if descending else "gt"}'
+            step = Q(**{lookup: values[position]})
+            for previous, value in zip(self.fields[:position], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def _flipped(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def _filtered(self, decoded):
+        direction, values = decoded
+        if len(values) != len(self.ordering):
+            raise ValueError('Cursor does not match ordering')
+        if direction == FORWARD:
+            return self.object_list.filter(self._after(values))
+        return self.object_list.filter(self._after(values, reverse=True))
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу после (или до) курсора.
+
+        Неверный курсор открывает первую страницу, как и
+        Paginator.get_page для неверного номера.
+        """
+        decoded = decode_cursor(cursor) if cursor else None
+        queryset = None
+        if decoded is not None:
+            try:
+                queryset = self._filtered(decoded)
+            except (ValidationError, ValueError, TypeError):
+                decoded = None
+        size = self.per_page
+        if decoded is None:
+            items = list(
+                self.object_list.order_by(*self.ordering)[:size + 1])
+            return KeysetPage(items[:size], self, '', len(items) > size)
+        if decoded[0] == FORWARD:
+            items = list(queryset.order_by(*self.ordering)[:size + 1])
+            return KeysetPage(
+                items[:size], self, cursor, len(items) > size, True)
+        items = list(queryset.order_by(*self._flipped())[:size + 1])
+        return KeysetPage(
+            items[:size][::-1], self, cursor, True, len(items) > size)
+
+
+def count_cache_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{queryset.db}:{sql}:{params}'.encode())
+    return f'paginator-count:{digest.hexdigest()}'
+
+
+def estimate_count(queryset):
+    """Оценка числа строк от планировщика или None, если её не получить."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def refresh_count(queryset, key):
+    """Считает строки точно и кладёт результат в кеш."""
+    count = queryset.count()
+    cache.set(key, (count, time.time()), settings.PAGINATOR_COUNT_TIMEOUT)
+    return count
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без точного COUNT(*) на каждой странице.
+
+    Короткие списки (до PAGINATOR_EXACT_COUNT_LIMIT) считаются точно,
+    запросом с LIMIT, так что его цена не растёт с размером таблицы.
+    Для длинных берётся число из кеша; если оно старше
+    PAGINATOR_COUNT_REFRESH секунд, точный пересчёт уходит в фон. При
+    пустом кеше на PostgreSQL используется оценка планировщика, на
+    остальных базах один раз выполняется точный COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        queryset = queryset.order_by()
+        try:
+            key = count_cache_key(queryset)
+        except EmptyResultSet:
+            return 0
+        cached = cache.get(key)
+        if cached is not None:
+            count, counted_at = cached
+            if time.time() - counted_at > settings.PAGINATOR_COUNT_REFRESH:
+                self._schedule_refresh(queryset, key)
+            return count
+        limit = settings.PAGINATOR_EXACT_COUNT_LIMIT
+        count = queryset[:limit + 1].count()
+        if count <= limit:
+            return count
+        estimate = estimate_count(queryset)
+        if estimate is None:
+            return refresh_count(queryset, key)
+        count = max(estimate, count)
+        cache.set(key, (count, 0), settings.PAGINATOR_COUNT_TIMEOUT)
+        self._schedule_refresh(queryset, key)
+        return count
+
+    def _schedule_refresh(self, queryset, key):
+        # add() срабатывает у одного запроса из многих одновременных.
+        if cache.add(f'{key}:refreshing', True,
+                     settings.PAGINATOR_COUNT_REFRESH):
+            submit(refresh_count, queryset, key)
 
 
 def get_page_obj(request, posts):
-    paginator = Paginator(posts, settings.SLICE)
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        return KeysetPaginator(posts, settings.SLICE).get_page(cursor)
+    paginator = EstimatedCountPaginator(posts, settings.SLICE)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+def get_comments_page(post_id, per_page, cursor=None):
+    """Страница комментариев поста, от новых к старым."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    paginator = KeysetPaginator(comments, per_page, ('-created', '-pk'))
+    return paginator.get_page(cursor)
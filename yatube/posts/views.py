@@ -1,56 +1,156 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import patch_cache_control, patch_vary_headers
 
-from .forms import PostForm, CommentForm
+from . import comment_buffer
+from .caching import (INDEX_SCOPE, conditional_response, feed_cache_context,
+                      follow_scope, group_scope, profile_scope)
+from .feeds import get_follow_feed
+from .forms import CommentForm, PostForm, SearchForm
 from .models import Follow, Group, Post, User
-from .utils import get_page_obj
+from .search import search_posts
+from .utils import KeysetPaginator, get_comments_page, get_page_obj
+
+# Карточки в лентах показывают только начало текста (excerpt_html).
+FEED_DEFERRED = ('text', 'text_html')
+
+
+def _cached_page(request, view_name, scopes, render_page):
+    """Анонимам — публичный кеш и 304, вошедшим — приватный ответ.
+
+    Страницы вошедших пользователей содержат их имя, подписки и формы
+    с CSRF-токеном, поэтому общие кеши их хранить не должны.
+    """
+    if request.user.is_authenticated:
+        response = render_page()
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        response = conditional_response(
+            request, scopes, render_page, public=True,
+            max_age=settings.PUBLIC_PAGE_MAX_AGE[view_name])
+    patch_vary_headers(response, ('Cookie',))
+    return response
 
 
 def index(request):
-    posts = Post.objects.all().select_related('author', 'group',)
-    page_obj = get_page_obj(request, posts)
-    return render(request, 'posts/index.html', {'page_obj': page_obj})
+    def render_page():
+        posts = Post.objects.all().select_related(
+            'author', 'group',).defer(*FEED_DEFERRED)
+        page_obj = get_page_obj(request, posts)
+        context = {
+            'page_obj': page_obj,
+            **feed_cache_context(page_obj, INDEX_SCOPE),
+        }
+        return render(request, 'posts/index.html', context)
+    return _cached_page(request, 'posts:index', (INDEX_SCOPE,), render_page)
 
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all().select_related('author',)
-    page_obj = get_page_obj(request, posts)
-    context = {
-        'group': group,
-        'page_obj': page_obj,
-    }
-    return render(request, 'posts/group_list.html', context)
+
+    def render_page():
+        posts = group.posts.all().select_related(
+            'author',).defer(*FEED_DEFERRED)
+        page_obj = get_page_obj(request, posts)
+        context = {
+            'group': group,
+            'page_obj': page_obj,
+            **feed_cache_context(page_obj, group_scope(group.pk)),
+        }
+        return render(request, 'posts/group_list.html', context)
+    return _cached_page(
+        request, 'posts:group_list', (group_scope(group.pk),), render_page)
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all().select_related('group')
-    page_obj = get_page_obj(request, posts)
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(user=request.user).exists()
-    )
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+
+    def render_page():
+        posts = author.posts.all().select_related('group').defer(
+            *FEED_DEFERRED)
+        page_obj = get_page_obj(request, posts)
+        following = (
+            request.user.is_authenticated
+            and author.following.filter(user=request.user).exists()
+        )
+        context = {
+            'following': following,
+            'author': author,
+            'page_obj': page_obj,
+            **feed_cache_context(page_obj, profile_scope(author.pk)),
+        }
+        return render(request, 'posts/profile.html', context)
+    return _cached_page(
+        request, 'posts:profile', (profile_scope(author.pk),), render_page)
+
+
+def search(request):
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        posts = search_posts(
+            Post.objects.select_related('author', 'group').defer(
+                *FEED_DEFERRED),
+            form.cleaned_data['q'],
+        )
+        if form.cleaned_data['group']:
+            posts = posts.filter(group=form.cleaned_data['group'])
+        if form.cleaned_data['author']:
+            posts = posts.filter(
+                author__username=form.cleaned_data['author'])
+        ordering = ('rank', '-pk')
+        if form.cleaned_data['order'] == 'new':
+            ordering = ('-pub_date', '-pk')
+        paginator = KeysetPaginator(posts, settings.SLICE, ordering)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    query = request.GET.copy()
+    query.pop('cursor', None)
     context = {
-        'following': following,
-        'author': author,
+        'form': form,
         'page_obj': page_obj,
+        'page_query': query.urlencode() + '&' if query else '',
     }
-    return render(request, 'posts/profile.html', context)
+    return render(request, 'posts/search.html', context)
 
 
 def post_detail(request, post_id):
     post = get_object_or_404(
-        Post.objects.select_related('author')
-        .prefetch_related('comments__author'),
+        Post.objects.select_related('author__stats', 'group'),
         pk=post_id
     )
+    # Правки поста и комментарии меняют версию профиля автора,
+    # переименование группы — версию группы.
+    scopes = [profile_scope(post.author_id)]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group_id))
+
+    def render_page():
+        context = {
+            'post': post,
+            'form': CommentForm(),
+            'comments': get_comments_page(
+                post.pk, settings.COMMENTS_FIRST_PAGE),
+        }
+        if settings.COMMENT_BUFFER and request.user.is_authenticated:
+            context['pending_comments'] = comment_buffer.pending_comments(
+                post.pk, request.user)
+        return render(request, 'posts/post_detail.html', context)
+    return _cached_page(request, 'posts:post_detail', scopes, render_page)
+
+
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
     context = {
         'post': post,
-        'form': CommentForm(),
-        'comments': post.comments.all(),
+        'comments': get_comments_page(
+            post.pk, settings.COMMENTS_PAGE_SIZE, request.GET.get('cursor')),
     }
-    return render(request, 'posts/post_detail.html', context)
+    if request.is_ajax():
+        return render(request, 'posts/includes/comment_list.html', context)
+    return render(request, 'posts/comment_list.html', context)
 
 
 @login_required
@@ -59,7 +159,10 @@ def post_create(request):
     if form.is_valid():
         new_post = form.save(commit=False)
         new_post.author = request.user
-        new_post.save()
+        # Блокировка на запись берётся только на время сохранения, а не
+        # на показ формы и обработку картинки.
+        with transaction.atomic():
+            new_post.save()
         return redirect('posts:profile', new_post.author)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -82,27 +185,37 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        # Буферизованный комментарий пишется в базу позже, и запрос не
+        # должен брать блокировку на запись (BEGIN IMMEDIATE).
+        if settings.COMMENT_BUFFER:
+            comment_buffer.enqueue(comment)
+        else:
+            with transaction.atomic():
+                comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = (
-        Post.objects.filter(author__following__user=request.user)
-        .select_related('author', 'group',)
-    )
+    posts = get_follow_feed(request.user).select_related(
+        'author', 'group',).defer(*FEED_DEFERRED)
     page_obj = get_page_obj(request, posts)
-    return render(request, 'posts/follow.html', {'page_obj': page_obj})
+    context = {
+        'page_obj': page_obj,
+        **feed_cache_context(
+            page_obj, INDEX_SCOPE, follow_scope(request.user.pk)),
+    }
+    return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -111,6 +224,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     (Follow.objects.filter(author__username=username, user=request.user)
      .delete())
@@ -1,4 +1,6 @@
+import hashlib
 import os
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -30,6 +32,8 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE = [
+    'core.profiling.QueryProfilingMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,7 +51,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.profiling.ProfilingDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,10 +68,28 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Загружать все шаблоны при старте WSGI-воркера (core.warmup).
+WARM_TEMPLATES_ON_START = False
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переиспользуется запросами одного потока.
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                # В режиме WAL NORMAL не теряет согласованность базы.
+                'synchronous': 'NORMAL',
+                'busy_timeout': 20000,
+                # Отрицательное значение — размер в КиБ: 64 МиБ.
+                'cache_size': -64000,
+                'mmap_size': 256 * 1024 * 1024,
+                'temp_store': 'MEMORY',
+            },
+        },
     }
 }
 
@@ -102,6 +124,32 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Отдавать собранную статику самим Django (core.static.serve), если
+# перед приложением нет веб-сервера, который делает это сам.
+STATIC_SERVE = False
+
+# Сколько секунд клиенты кешируют файлы статики с хешем в имени.
+STATIC_MAX_AGE = 60 * 60 * 24 * 365
+
+# Сжатие ответов и статики (core.compression).
+COMPRESS_MIN_SIZE = 1024
+
+COMPRESS_CONTENT_TYPES = (
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+)
+
+COMPRESS_GZIP_LEVEL = 6
+
+COMPRESS_BROTLI_QUALITY = 5
+
 SLICE = 10
 
 LOGIN_URL = 'users:login'
@@ -116,6 +164,135 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'L1_SYNC_INTERVAL': 1,
+            'BYPASS_PREFIXES': ('feed-version:', 'comment-overlay:'),
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        # Свой каталог на каждую базу: значения (например, число строк
+        # для пагинатора) не переезжают между базами и checkout'ами.
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_DIR',
+            os.path.join(
+                tempfile.gettempdir(), 'yatube_cache',
+                hashlib.md5(
+                    DATABASES['default']['NAME'].encode()).hexdigest(),
+            ),
+        ),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+# manage.py test подменяет кеши на CACHES из yatube.settings_test.
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+FEED_FANOUT_LIMIT = 1000
+
+FEED_BACKFILL_LIMIT = 1000
+
+FEED_BATCH_SIZE = 500
+
+FEED_CACHE_TIMEOUT = 300
+
+# Готовые карточки постов (posts.templatetags.post_cards).
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+BACKGROUND_WORKERS = 2
+
+# Загрузки сразу пишутся во временный файл, а не копятся в памяти.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+POST_IMAGE_MAX_SIZE = (2048, 2048)
+
+# Первый формат, поддерживаемый установленным Pillow.
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+
+POST_IMAGE_QUALITY = 85
+
+# Сколько секунд файл без ссылок ждёт удаления командой collect_media.
+MEDIA_GC_GRACE = 60 * 60
+
+POST_THUMBNAIL_SIZE = (960, 339)
+
+POST_THUMBNAIL_QUALITY = 85
+
+SEARCH_BACKEND = 'auto'
+
+PAGINATOR_EXACT_COUNT_LIMIT = 1000
+
+PAGINATOR_COUNT_REFRESH = 60
+
+PAGINATOR_COUNT_TIMEOUT = 24 * 60 * 60
+
+PAGINATOR_WINDOW = 2
+
+API_PAGE_SIZE_LIMIT = 100
+
+# Входит в ETag HTML-страниц: увеличьте при изменении шаблонов, чтобы
+# клиенты не получили 304 со старой вёрсткой.
+PAGE_CACHE_VERSION = 1
+
+# max-age публичных страниц для анонимных посетителей, в секундах.
+PUBLIC_PAGE_MAX_AGE = {
+    'posts:index': 60,
+    'posts:group_list': 120,
+    'posts:profile': 120,
+    'posts:post_detail': 300,
+}
+
+COMMENTS_FIRST_PAGE = 20
+
+COMMENTS_PAGE_SIZE = 50
+
+# Отложенная запись комментариев пачками (posts.comment_buffer).
+COMMENT_BUFFER = False
+
+COMMENT_BUFFER_BATCH = 100
+
+COMMENT_BUFFER_INTERVAL = 0.5
+
+# Сколько раз пачка возвращается в очередь после ошибки записи, прежде
+# чем комментарии сохраняются по одному.
+COMMENT_BUFFER_RETRIES = 3
+
+# Сколько секунд автор видит свой комментарий до его записи в базу.
+COMMENT_OVERLAY_TIMEOUT = 60
+
+# Сколько ещё не записанных комментариев к одному посту автор видит сразу.
+COMMENT_OVERLAY_SLOTS = 20
+
+QUERY_PROFILING = DEBUG
+
+QUERY_REPEAT_THRESHOLD = 5
+
+QUERY_BUDGET_STRICT = False
+
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 6,
+    'posts:profile': 7,
+    'posts:post_detail': 5,
+    'posts:follow_index': 6,
+    'posts:comment_list': 4,
+    'posts:search': 5,
+    'posts:api_index': 2,
+    'posts:api_group_list': 3,
+    'posts:api_profile': 3,
+    'posts:api_post_detail': 3,
+    'posts:api_follow_index': 4,
 }
@@ -0,0 +1,53 @@
+"""Настройки боевого запуска.
+
+DJANGO_SETTINGS_MODULE=yatube.settings_production. Шаблоны читаются
+кешированным загрузчиком и прогреваются при старте воркера (см.
+wsgi.py и команду warm_templates). Статика собирается collectstatic
+с хешами в именах и сжатыми копиями (core.storage).
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import TEMPLATES
+
+DEBUG = False
+
+# Ключ из репозитория известен всем, поэтому без своего не запускаемся.
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Задайте DJANGO_SECRET_KEY')
+
+ALLOWED_HOSTS = os.environ.get(
+    'DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+QUERY_PROFILING = False
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        # Загрузчики заданы явно, поэтому APP_DIRS выключен.
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'context_processors': [
+                processor
+                for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if processor != 'django.template.context_processors.debug'
+            ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+WARM_TEMPLATES_ON_START = True
+
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+STATIC_SERVE = os.environ.get('DJANGO_STATIC_SERVE', '1') == '1'
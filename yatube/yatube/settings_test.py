@@ -0,0 +1,19 @@
+"""Настройки тестов.
+
+DJANGO_SETTINGS_MODULE=yatube.settings_test (pytest.ini). Общий уровень
+кеша живёт в памяти, чтобы тесты не читали и не портили файловый кеш
+сервера разработки.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES
+
+CACHES = {
+    **CACHES,
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-tests',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
@@ -1,7 +1,9 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from core.static import serve as serve_static
 
 
 urlpatterns = [
@@ -19,3 +21,11 @@ if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )
+
+if settings.STATIC_SERVE:
+    urlpatterns += [
+        re_path(
+            r'^{}(?P<path>.+)$'.format(settings.STATIC_URL.lstrip('/')),
+            serve_static,
+        ),
+    ]